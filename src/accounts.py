@@ -0,0 +1,196 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, or_, select
+from sqlalchemy.exc import IntegrityError
+from models import User, Order
+
+# scrypt cost; raise KHATA_SCRYPT_N (a power of two) as hardware allows
+SCRYPT_N = int(os.environ.get("KHATA_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.environ.get("KHATA_SCRYPT_R", "8"))
+SCRYPT_P = int(os.environ.get("KHATA_SCRYPT_P", "1"))
+
+# At most this many hashes run at once, so a login storm queues instead of
+# starving the rest of the app of CPU and memory (each hash uses ~128*N*R bytes)
+LOGIN_WORKERS = int(os.environ.get("KHATA_LOGIN_WORKERS", "4"))
+LOGIN_TIMEOUT = float(os.environ.get("KHATA_LOGIN_TIMEOUT", "10"))
+
+# Failed attempts allowed per email within the window before logins are refused
+LOGIN_MAX_ATTEMPTS = int(os.environ.get("KHATA_LOGIN_MAX_ATTEMPTS", "5"))
+LOGIN_WINDOW = float(os.environ.get("KHATA_LOGIN_WINDOW", "300"))
+# At most this many emails are tracked; past it the longest-idle ones are forgotten
+LOGIN_TRACKED_EMAILS = int(os.environ.get("KHATA_LOGIN_TRACKED_EMAILS", "10000"))
+
+_verify_pool = ThreadPoolExecutor(max_workers=LOGIN_WORKERS, thread_name_prefix="khata-login")
+_attempts_lock = threading.Lock()
+# email -> monotonic times of recent failures, least recently failed email first
+_failed_attempts = OrderedDict()
+
+
+def user_page(session, page_size, after=None, search=None):
+    """(rows, next_cursor) for the user directory ordered by user_id.
+
+    Each row is (User, order_count); counts come from a correlated COUNT over
+    the orders.user_id index instead of loading every user's orders. `search`
+    matches the start of the name or email, case-insensitively, so the
+    lower(name)/lower(email) indexes can serve it. `after` is the last user_id
+    of the previous page.
+    """
+    order_count = (
+        select(func.count(Order.order_id))
+        .where(Order.user_id == User.user_id)
+        .correlate(User)
+        .scalar_subquery()
+        .label("order_count")
+    )
+    query = session.query(User, order_count)
+    if search:
+        term = search.strip().lower()
+        query = query.filter(or_(
+            func.lower(User.name).startswith(term, autoescape=True),
+            func.lower(User.email).startswith(term, autoescape=True),
+        ))
+    if after is not None:
+        query = query.filter(User.user_id > after)
+
+    rows = query.order_by(User.user_id).limit(page_size + 1).all()
+    if len(rows) <= page_size:
+        return rows, None
+    return rows[:page_size], rows[page_size - 1][0].user_id
+
+
+def get_user(session, user_id):
+    """The User with `user_id`, or None."""
+    return session.get(User, user_id)
+
+
+def customers(session):
+    """Users with the Customer role, by name."""
+    return session.query(User).filter_by(role="Customer").order_by(User.name).all()
+
+
+def create_user(session, name, role, contact=None, email=None, password=None):
+    """Add a user, hashing the password if one is given, and commit.
+
+    Raises ValueError if the email is already registered.
+    """
+    user = User(name=name, role=role, contact=contact, email=email,
+                password=hash_password(password) if password else None)
+    session.add(user)
+    try:
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise ValueError("That email is already registered.")
+    return user
+
+
+def delete_user(session, user_id):
+    """Delete a user and, through the model cascades, their data; commits. Returns the deleted user or None."""
+    user = session.get(User, user_id)
+    if user:
+        session.delete(user)
+        session.commit()
+    return user
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r * p + 2 ** 20)
+
+
+def hash_password(password):
+    """Salted scrypt hash stored as 'scrypt$n$r$p$salt$hash' (base64 parts)."""
+    salt = secrets.token_bytes(16)
+    digest = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return "$".join([
+        "scrypt", str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P),
+        base64.b64encode(salt).decode(), base64.b64encode(digest).decode(),
+    ])
+
+
+def verify_password(password, stored):
+    """Check `password` against a stored hash; rows from before hashing hold plain text."""
+    if not stored:
+        return False
+    if not stored.startswith("scrypt$"):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    _, n, r, p, salt, digest = stored.split("$")
+    candidate = _scrypt(password, base64.b64decode(salt), int(n), int(r), int(p))
+    return hmac.compare_digest(candidate, base64.b64decode(digest))
+
+
+def needs_rehash(stored):
+    """True for plain-text passwords and hashes made with a different cost than the current one."""
+    return not (stored or "").startswith(f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}$")
+
+
+# Verified against when the email is unknown, so response time doesn't reveal which emails exist
+_DUMMY_HASH = hash_password(secrets.token_hex(8))
+
+
+def _recent_failures(email, now):
+    failures = _failed_attempts.get(email)
+    if failures is None:
+        return 0
+    while failures and now - failures[0] > LOGIN_WINDOW:
+        failures.popleft()
+    if not failures:
+        del _failed_attempts[email]
+    return len(failures)
+
+
+def _record_failure(email, now):
+    failures = _failed_attempts.pop(email, None) or deque(maxlen=LOGIN_MAX_ATTEMPTS)
+    failures.append(now)
+    _failed_attempts[email] = failures
+    # Entries are in order of their latest failure, so expired ones are all at the front
+    while _failed_attempts:
+        oldest = next(iter(_failed_attempts.values()))
+        if now - oldest[-1] <= LOGIN_WINDOW and len(_failed_attempts) <= LOGIN_TRACKED_EMAILS:
+            break
+        _failed_attempts.popitem(last=False)
+
+
+def authenticate(session, email, password):
+    """Return the User for valid credentials, or None.
+
+    Raises ValueError when the email has too many recent failed attempts, and
+    TimeoutError when the verification pool is too busy to check the password
+    within LOGIN_TIMEOUT. Verification runs on a bounded thread pool.
+    Plain-text or outdated hashes are upgraded to the current cost after a
+    successful login.
+    """
+    email = (email or "").strip().lower()
+    with _attempts_lock:
+        if _recent_failures(email, time.monotonic()) >= LOGIN_MAX_ATTEMPTS:
+            raise ValueError("Too many failed attempts. Please try again in a few minutes.")
+
+    user = session.query(User).filter(func.lower(User.email) == email).first()
+    stored = user.password if user else _DUMMY_HASH
+    # End the read transaction so the connection goes back to the pool while we hash
+    session.commit()
+    check = _verify_pool.submit(verify_password, password, stored)
+    try:
+        ok = check.result(timeout=LOGIN_TIMEOUT)
+    except TimeoutError:
+        check.cancel()  # still queued: nobody is waiting for it any more
+        raise
+
+    with _attempts_lock:
+        if ok and user:
+            _failed_attempts.pop(email, None)
+        else:
+            _record_failure(email, time.monotonic())
+    if not (ok and user):
+        return None
+
+    if needs_rehash(user.password):
+        user.password = hash_password(password)
+        session.commit()
+    return user
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from sqlalchemy import Float, cast, select, union_all
+from models import Order, OrderItems, ArchivedOrder, ArchivedOrderItems, MenuItem
+
+# Results are reused for this many seconds per date range, and at most this many ranges are kept
+ANALYTICS_TTL = float(os.environ.get("KHATA_ANALYTICS_TTL", "600"))
+ANALYTICS_CACHE_SIZE = 16
+
+# Orders are turned into an order x item matrix this many orders at a time
+BASKET_CHUNK = 100_000
+
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+MenuAnalytics = namedtuple("MenuAnalytics", ["engineering", "pairs", "heatmap", "orders", "lines"])
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # (start, end) -> (loaded_at, MenuAnalytics)
+
+
+def line_items(session, start, end):
+    """DataFrame of every line item, current and archived, of orders placed between the inclusive dates.
+
+    One UNION ALL query; columns are order_id, order_time, item_id, quantity
+    and revenue. Revenue is cast to a float in SQL, which halves the fetch time
+    compared with building a Decimal per row.
+    """
+    since = datetime.combine(start, datetime.min.time())
+    until = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    current = (
+        select(OrderItems.order_id, Order.order_time, OrderItems.item_id,
+               OrderItems.quantity, cast(OrderItems.total_price, Float).label("revenue"))
+        .join(Order, Order.order_id == OrderItems.order_id)
+        .where(Order.order_time >= since, Order.order_time < until)
+    )
+    archived = (
+        select(ArchivedOrderItems.order_id, ArchivedOrder.order_time, ArchivedOrderItems.menu_item_id,
+               ArchivedOrderItems.quantity, cast(ArchivedOrderItems.total_price, Float))
+        .join(ArchivedOrder, ArchivedOrder.order_id == ArchivedOrderItems.order_id)
+        .where(ArchivedOrder.order_time >= since, ArchivedOrder.order_time < until)
+    )
+    result = session.execute(union_all(current, archived))
+    frame = pd.DataFrame(result.all(), columns=list(result.keys()))
+    frame = frame.dropna(subset=["item_id"]).astype({"order_id": "int64", "item_id": "int64"})
+    frame["quantity"] = frame["quantity"].fillna(0).astype("int64")
+    frame["revenue"] = frame["revenue"].fillna(0).astype("float64")
+    frame["order_time"] = pd.to_datetime(frame["order_time"])
+    return frame
+
+
+def menu_engineering(lines, names):
+    """Popularity vs margin quadrants per menu item (Star, Plowhorse, Puzzle, Dog).
+
+    An item is popular when its share of units sold is at least 70% of an even
+    share. Food costs aren't stored, so margin is approximated by the average
+    price the item actually sold at, split at the units-weighted average.
+    """
+    items = lines.groupby("item_id").agg(units=("quantity", "sum"), revenue=("revenue", "sum"))
+    items = items[items["units"] > 0]
+    if items.empty:
+        return items.assign(name=[], share=[], margin=[], quadrant=[])
+    items["share"] = items["units"] / items["units"].sum()
+    items["margin"] = items["revenue"] / items["units"]
+    popular = items["share"].to_numpy() >= 0.7 / len(items)
+    profitable = items["margin"].to_numpy() >= items["revenue"].sum() / items["units"].sum()
+    items["quadrant"] = np.select(
+        [popular & profitable, popular & ~profitable, ~popular & profitable],
+        ["Star", "Plowhorse", "Puzzle"], default="Dog",
+    )
+    items["name"] = items.index.map(names).fillna("Unknown Item")
+    return items.sort_values("units", ascending=False)
+
+
+def basket_pairs(lines, names, top=20):
+    """The `top` item pairs most often ordered together, with support, confidence and lift.
+
+    Builds a boolean order x item matrix in chunks and accumulates X.T @ X,
+    so co-occurrence counts come from matrix products instead of per-order loops.
+    """
+    baskets = lines[["order_id", "item_id"]].drop_duplicates()
+    order_codes, orders = pd.factorize(baskets["order_id"], sort=True)
+    item_codes, item_ids = pd.factorize(baskets["item_id"], sort=True)
+    n_orders, n_items = len(orders), len(item_ids)
+    if n_items < 2:
+        return pd.DataFrame(columns=["item_a", "item_b", "orders", "support", "confidence", "lift"])
+
+    together = np.zeros((n_items, n_items), dtype=np.int64)
+    for first in range(0, n_orders, BASKET_CHUNK):
+        mask = (order_codes >= first) & (order_codes < first + BASKET_CHUNK)
+        rows = np.zeros((min(BASKET_CHUNK, n_orders - first), n_items), dtype=np.float32)
+        rows[order_codes[mask] - first, item_codes[mask]] = 1
+        together += (rows.T @ rows).astype(np.int64)
+
+    counts = np.diag(together).astype(np.float64)
+    a, b = np.triu_indices(n_items, k=1)
+    both = together[a, b]
+    keep = both > 0
+    a, b, both = a[keep], b[keep], both[keep]
+    support = both / n_orders
+    # Confidence of the stronger direction; lift is symmetric
+    confidence = both / np.minimum(counts[a], counts[b])
+    lift = support / ((counts[a] / n_orders) * (counts[b] / n_orders))
+    pairs = pd.DataFrame({
+        "item_a": pd.Index(item_ids[a]).map(names).fillna("Unknown Item"),
+        "item_b": pd.Index(item_ids[b]).map(names).fillna("Unknown Item"),
+        "orders": both, "support": support, "confidence": confidence, "lift": lift,
+    })
+    return pairs.sort_values(["orders", "lift"], ascending=False).head(top).reset_index(drop=True)
+
+
+def hour_heatmap(lines):
+    """7 x 24 DataFrame (weekday x hour of day) of orders placed, via one bincount."""
+    orders = lines.drop_duplicates("order_id")["order_time"]
+    cells = orders.dt.weekday.to_numpy() * 24 + orders.dt.hour.to_numpy()
+    counts = np.bincount(cells, minlength=7 * 24).reshape(7, 24)
+    return pd.DataFrame(counts, index=DAYS, columns=range(24))
+
+
+def menu_analytics(session, start, end):
+    """MenuAnalytics for orders placed between the inclusive dates, cached per range for ANALYTICS_TTL."""
+    key = (start, end)
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(key)
+        if hit and now - hit[0] < ANALYTICS_TTL:
+            _cache.move_to_end(key)
+            return hit[1]
+
+    lines = line_items(session, start, end)
+    names = dict(session.execute(select(MenuItem.item_id, MenuItem.name)).all())
+    result = MenuAnalytics(
+        engineering=menu_engineering(lines, names),
+        pairs=basket_pairs(lines, names),
+        heatmap=hour_heatmap(lines),
+        orders=lines["order_id"].nunique(),
+        lines=len(lines),
+    )
+
+    with _lock:
+        _cache[key] = (now, result)
+        _cache.move_to_end(key)
+        while len(_cache) > ANALYTICS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+
+def clear_analytics_cache():
+    with _lock:
+        _cache.clear()
@@ -1,16 +1,78 @@
 import streamlit as st
-from db import session
-from models import MenuItem, Order, Table, Inventory, Feedback, User, Reservation, OrderItems, ArchivedOrder, \
-    ArchivedOrderItems
-from datetime import date
-from sqlalchemy import func
+import pandas as pd
+import altair as alt
+from sqlalchemy.exc import OperationalError
+from db import Session, session, ReadSession, read_session
+from orders import order_page, archived_order_page, create_order, customer_orders, clear_orders, archive_orders, \
+    archive_completed_orders, delete_archived_order, KitchenBoard, OPEN_STATUSES, open_orders, next_statuses, \
+    transition_order_status
+from catalogue import CATEGORIES, cached_menu, bump_menu_version, add_menu_item, delete_menu_item, parse_menu_file, \
+    validate_menu_rows, diff_menu, plan_reprice, apply_menu_diff, delete_menu_items, price_history
+from reservations import DEFAULT_DURATION, MAX_DURATION, all_tables, find_best_table, book_table, reservation_page, \
+    reservations_on, upcoming_reservations
+from stock import add_stock_item, receive_stock, record_waste, stock_at, stock_items, \
+    set_recipe_item, recipe_lines, expiring_items, low_stock_items, reorder_lists, inventory_page
+from accounts import user_page, authenticate, get_user, customers, create_user, delete_user
+from reports import recompute_sales_rollups, fold_pending_sales, sales_totals, sales_series, top_items, \
+    submit_feedback, recompute_rating_rollups, daily_ratings, item_ratings, feedback_page
+from analytics import DAYS, menu_analytics
+from exports import FORMATS, export_file
+from perf import N_PLUS_ONE_MIN, begin_run, name_run, end_run, track, page_stats, recent_runs, reset_stats
+from datetime import date, timedelta
 from datetime import datetime
-from sqlalchemy.exc import IntegrityError
 
 st.set_page_config(page_title="Khata Admin Dashboard", layout="wide")
 
+# Start every script run with a fresh session so a failed commit or stale objects
+# from the previous run (e.g. one cut short by st.rerun) never leak into this one
+Session.remove()
+ReadSession.remove()
+begin_run("Login")  # renamed to the selected page once the sidebar is drawn
+
 #---------------------Functions------------------
 
+PAGE_SIZES = [10, 25, 50, 100]
+
+
+def _reset_pages(key):
+    st.session_state[f"{key}_cursors"] = [None]
+
+
+def page_filters(key, dates=True):
+    """Render page-size (and date-range) controls; return (page_size, start, end, cursor) for the current page."""
+    if f"{key}_cursors" not in st.session_state:
+        _reset_pages(key)
+
+    start = end = None
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size",
+                                 on_change=_reset_pages, args=(key,))
+    if dates:
+        with c2:
+            start = st.date_input("From", value=None, key=f"{key}_start", on_change=_reset_pages, args=(key,))
+        with c3:
+            end = st.date_input("To", value=None, key=f"{key}_end", on_change=_reset_pages, args=(key,))
+
+    return page_size, start, end, st.session_state[f"{key}_cursors"][-1]
+
+
+def page_nav(key, next_cursor):
+    """Render Previous/Next buttons; the cursor stack in session_state remembers earlier pages."""
+    cursors = st.session_state[f"{key}_cursors"]
+    c1, c2, c3 = st.columns([1, 1, 4])
+    with c1:
+        if len(cursors) > 1 and st.button("⬅ Previous", key=f"{key}_prev"):
+            cursors.pop()
+            st.rerun()
+    with c2:
+        if next_cursor is not None and st.button("Next ➡", key=f"{key}_next"):
+            cursors.append(next_cursor)
+            st.rerun()
+    with c3:
+        st.caption(f"Page {len(cursors)}")
+
+
 def menu_management():
     st.header("📋 Menu Management")
     col1, col2 = st.columns([1.2, 2])
@@ -19,23 +81,71 @@ def menu_management():
         with st.expander("➕ Add New Menu Item", expanded=True):
             with st.form("add_menu_form"):
                 name = st.text_input("🍽 Item Name", placeholder="e.g. Chicken Biryani")
-                category = st.selectbox("📂 Category", ["Starter", "Main Course", "Drink", "Dessert"])
+                category = st.selectbox("📂 Category", CATEGORIES)
                 price = st.number_input("💵 Price (PKR)", min_value=0.0, format="%.2f")
                 availability = st.radio("✅ Available?", ["Yes", "No"], horizontal=True)
                 ingredients = st.text_area("🧂 Ingredients", placeholder="e.g. Chicken, Rice, Spices")
                 submit_button = st.form_submit_button("Add Item")
 
                 if submit_button:
-                    item = MenuItem(name=name, category=category, price=price,
-                                    availability=(availability == "Yes"), ingredients=ingredients)
-                    session.add(item)
-                    session.commit()
+                    add_menu_item(session, name, category, price,
+                                  availability=(availability == "Yes"), ingredients=ingredients)
                     st.success(f"✅ “{name}” added to the menu!")
                     st.rerun()
 
+        with st.expander("📤 Bulk Import (CSV / JSON)"):
+            st.caption("Columns: name, category, price, availability, ingredients (optional item_id). "
+                       "Rows match existing items by item_id or name; missing columns are left unchanged.")
+            upload = st.file_uploader("Menu file", type=["csv", "json"], key="menu_import_file")
+            if upload is not None:
+                try:
+                    rows = parse_menu_file(upload.getvalue(), upload.name)
+                    errors = validate_menu_rows(rows)
+                    diff = None if errors else diff_menu(session, rows)
+                except ValueError as e:
+                    errors, diff = [(None, str(e))], None
+                if errors:
+                    # The whole file is checked first; nothing is applied while any row is invalid
+                    st.error(f"❌ {len(errors)} problem(s) found, nothing was imported:")
+                    for row_no, message in errors[:50]:
+                        st.write(f"• Row {row_no}: {message}" if row_no else f"• {message}")
+                else:
+                    menu_diff_summary(diff)
+                    if (diff.added or diff.changed) and st.button("✅ Apply Import", key="apply_menu_import"):
+                        added, changed = apply_menu_diff(session, diff, source="import")
+                        st.success(f"Imported: {added} added, {changed} updated.")
+
+        with st.expander("💱 Bulk Price Change"):
+            percent = st.number_input("Change prices by (%)", min_value=-90.0, max_value=500.0, value=0.0,
+                                      step=1.0, key="reprice_percent")
+            reprice_category = st.selectbox("Category", ["All"] + CATEGORIES, key="reprice_category")
+            if percent:
+                diff = plan_reprice(session, percent, None if reprice_category == "All" else reprice_category)
+                menu_diff_summary(diff)
+                if diff.changed and st.button("✅ Apply Price Change", key="apply_reprice"):
+                    _, changed = apply_menu_diff(session, diff, source="reprice")
+                    st.success(f"Repriced {changed} item(s).")
+                    st.rerun()
+
+        with st.expander("🗑 Bulk Delete"):
+            labels = {f"{m.name} (#{m.item_id})": m.item_id for m in cached_menu(session)}
+            doomed = st.multiselect("Items to delete", list(labels.keys()), key="bulk_delete_items")
+            if doomed and st.checkbox(f"Also delete their order lines and recipes ({len(doomed)} item(s))",
+                                      key="bulk_delete_confirm"):
+                if st.button("🗑 Delete Selected", key="bulk_delete_button"):
+                    deleted = delete_menu_items(session, [labels[d] for d in doomed])
+                    st.warning(f"🗑 Deleted {deleted} item(s).")
+                    st.rerun()
+
+        with st.expander("🕓 Price History"):
+            for change, item_name in price_history(session, limit=50):
+                old = f"PKR {change.old_price:.2f}" if change.old_price is not None else "new"
+                st.write(f"{change.changed_at:%Y-%m-%d %H:%M} • {item_name or f'Item #{change.item_id}'}: "
+                         f"{old} → PKR {change.new_price:.2f} ({change.source})")
+
     with col2:
         st.subheader("📦 Existing Menu Items")
-        items = session.query(MenuItem).order_by(MenuItem.name).all()
+        items = cached_menu(session)
         if not items:
             st.info("No menu items found.")
         else:
@@ -47,16 +157,28 @@ def menu_management():
                         st.markdown(f"🔘 {'Available' if item.availability else 'Unavailable'}")
                     with row[1]:
                         if st.button("🗑 Delete", key=f"delete_{item.item_id}", use_container_width=True):
-                            session.delete(item)
-                            session.commit()
+                            delete_menu_item(session, item.item_id)
                             st.warning(f"🗑 “{item.name}” deleted!")
                             st.rerun()
 
+def menu_diff_summary(diff):
+    """Show what a bulk menu change would do before it is applied."""
+    st.write(f"**{len(diff.added)}** new, **{len(diff.changed)}** changed, **{diff.unchanged}** unchanged")
+    if diff.added:
+        st.dataframe(pd.DataFrame(diff.added), hide_index=True)
+    if diff.changed:
+        st.dataframe(pd.DataFrame([
+            {"Item": f"{name} (#{item_id})", "Field": field, "Old": str(old), "New": str(new)}
+            for item_id, name, changes in diff.changed
+            for field, (old, new) in changes.items()
+        ]), hide_index=True)
+
+
 def place_order():
     st.header("🧾 Place Your Order")
 
-    # Fetch only available menu items
-    items = session.query(MenuItem).filter_by(availability=True).all()
+    # Only available menu items, served from the process-wide menu cache
+    items = cached_menu(session, available_only=True)
     if not items:
         st.info("Sorry, no menu items are currently available.")
         return
@@ -104,47 +226,32 @@ def place_order():
             st.error("User not logged in. Please log in first.")
             return
 
-        # Create the order
-        order = Order(
-            user_id=user_id,
-            table_id=table_id,
-            total_amount=total,
-            status="Pending",
-            payment_status="Unpaid"
-        )
-        session.add(order)
-        session.commit()
-
-        # Now add all the OrderItems
-        for item_id, qty in quantities.items():
-            if qty > 0:
-                # Modern API: fetch by primary key
-                menu_item = session.get(MenuItem, item_id)
-                if menu_item:
-                    order_item = OrderItems(
-                        order_id=order.order_id,
-                        item_id=menu_item.item_id,
-                        quantity=qty,
-                        total_price=menu_item.price * qty
-                    )
-                    session.add(order_item)
-
-        # Now commit all the OrderItems in one go
-        session.commit()
+        # Order, line items and total are written in one transaction using current menu prices
+        try:
+            order, lines = create_order(session, user_id, table_id, quantities)
+        except ValueError as e:
+            st.error(str(e))
+            return
+        except OperationalError:
+            # e.g. a lock timeout at rush hour; the order was rolled back as a whole
+            st.error("We couldn't place your order just now. Please try again.")
+            return
 
         # Show summary
+        names = {i.item_id: i.name for i in items}
         st.success(f"✅ Order #{order.order_id} placed!")
         st.markdown("**Your Order:**")
-        for item_id, qty in quantities.items():
-            item = next(i for i in items if i.item_id == item_id)
-            st.markdown(f"- {item.name} x {qty} = PKR{item.price * qty:.2f}")
-        st.markdown(f"**Total:** PKR{total:.2f}")
+        for line in lines:
+            st.markdown(f"- {names[line['item_id']]} x {line['quantity']} = PKR{line['total_price']:.2f}")
+        st.markdown(f"**Total:** PKR{order.total_amount:.2f}")
 
 
 def track_orders():
     st.header("📋 Track Orders")
 
-    orders = session.query(Order).order_by(Order.order_time.desc()).all()
+    # Users, line items and menu items are eager-loaded, so rendering below issues no extra queries
+    page_size, start, end, cursor = page_filters("track_orders")
+    orders, next_cursor = order_page(session, page_size, after=cursor, start=start, end=end)
     if not orders:
         st.info("No orders found.")
         return
@@ -163,50 +270,106 @@ def track_orders():
         # Show ordered items
         st.markdown("**🧾 Items Ordered:**")
         for item in o.order_items:
-            menu_item = session.query(MenuItem).filter_by(item_id=item.item_id).first()
+            menu_item = item.menu_item
             if menu_item:
                 st.markdown(f"- {menu_item.name} x {item.quantity} = PKR{menu_item.price * item.quantity:.2f}")
 
         st.divider()
 
+    page_nav("track_orders", next_cursor)
+
 
 # 3. UPDATE ORDER STATUS
 def update_order_status():
     st.header("🔄 Update Order Status")
 
     # Pull only orders that are not yet Completed
-    orders = session.query(Order).filter(Order.status != "Completed").all()
+    orders = open_orders(session)
 
     if not orders:
         st.info("All orders are completed!")
         return
 
-    valid_statuses = ["Pending", "In Progress", "Completed"]
-
     for o in orders:
+        # Version this page showed last time, so a change by another tablet in between is caught
+        shown_key = f"shown_version_{o.order_id}"
+        shown_version = st.session_state.get(shown_key, o.version)
+
         cols = st.columns([3, 2, 1])
         with cols[0]:
             st.markdown(f"*Order #{o.order_id}* | Table {o.table_id} | Current: *{o.status}*")
         with cols[1]:
+            options = next_statuses(o.status)
             new_status = st.selectbox(
                 f"New status for #{o.order_id}",
-                valid_statuses,
-                index=valid_statuses.index(o.status),
-                key=f"status_{o.order_id}"
+                options,
+                key=f"status_{o.order_id}_{o.status}",
+                disabled=not options
             )
         with cols[2]:
-            if st.button(f"Update", key=f"btn_{o.order_id}"):
-                o.status = new_status
-                session.commit()
-                st.success(f"Order #{o.order_id} → {new_status}")
-                st.rerun()
+            if st.button(f"Update", key=f"btn_{o.order_id}", disabled=not options):
+                try:
+                    transition_order_status(session, o.order_id, new_status, expected_version=shown_version)
+                    st.session_state.pop(shown_key, None)
+                    st.success(f"Order #{o.order_id} → {new_status}")
+                    st.rerun()
+                except ValueError as e:
+                    st.warning(f"⚠️ {e} Please review and try again.")
+        st.session_state[shown_key] = o.version
+
+
+def kitchen_display():
+    st.header("👨‍🍳 Kitchen Display")
+
+    interval = st.selectbox("Auto-refresh every (seconds)", [5, 10, 30, 60], index=1, key="kitchen_interval")
+    if "kitchen_board" not in st.session_state:
+        st.session_state.kitchen_board = KitchenBoard()
+
+    # Only this fragment reruns on the timer, and each poll fetches just the orders changed since the last one
+    @st.fragment(run_every=interval)
+    def board():
+        kb = st.session_state.kitchen_board
+        with track("Kitchen Display (poll)"):
+            changed = kb.refresh(session)
+        Session.remove()  # don't hold a connection between polls
+        st.caption(f"Updated {datetime.utcnow().strftime('%H:%M:%S')} UTC • {changed} order(s) applied")
+
+        cols = st.columns(2)
+        for col, status in zip(cols, OPEN_STATUSES):
+            with col:
+                tickets = kb.by_status(status)
+                st.subheader(f"{status} ({len(tickets)})")
+                for t in tickets:
+                    with st.container(border=True):
+                        st.markdown(
+                            f"**🧾 Order #{t['order_id']}** • Table {t['table_id']} • "
+                            f"{t['order_time'].strftime('%H:%M')}  \n"
+                            + "  \n".join(f"- {name} x {qty}" for name, qty in t["items"])
+                        )
+
+    board()
 
 
 def admin_order_management():
     st.header("🛒 Order Management")
 
-    # Fetch all orders
-    orders = session.query(Order).all()
+    with st.expander("📦 Bulk Archive Completed Orders"):
+        with st.form("bulk_archive_form"):
+            cutoff_date = st.date_input("Archive completed orders placed before", value=date.today())
+            cutoff_time = st.time_input("Time", value=datetime.min.time())
+            submitted = st.form_submit_button("Archive")
+        if submitted:
+            count = archive_completed_orders(session, datetime.combine(cutoff_date, cutoff_time))
+            _reset_pages("admin_orders")
+            st.success(f"✅ Archived {count} completed order(s).")
+
+    # Fetch one page of orders
+    page_size, start, end, cursor = page_filters("admin_orders")
+    orders, next_cursor = order_page(session, page_size, after=cursor, start=start, end=end)
+
+    if not orders:
+        st.info("No orders found.")
+        return
 
     for order in orders:
         with st.expander(f"Order {order.order_id} Details"):
@@ -223,25 +386,25 @@ def admin_order_management():
 
             with col1:
                 if st.button("Save to Archive", key=f"archive_{order.order_id}"):
-                    order.status = "Archived"  # Mark order as archived
-                    session.commit()           # Commit status change to trigger
-                    session.delete(order)      # Then delete the order
-                    session.commit()
-                    st.success(f"Order {order.order_id} archived successfully!")
+                    order_id = order.order_id
+                    archive_orders(session, [order_id])  # order + items moved in one transaction
+                    st.success(f"Order {order_id} archived successfully!")
 
             with col2:
                 if st.button("View Order", key=f"view_{order.order_id}"):
                     st.write("**Order Items:**")
-                    order_items = session.query(OrderItems).filter(OrderItems.order_id == order.order_id).all()
-                    for item in order_items:
+                    for item in order.order_items:
                         st.write(f"- Item: {item.menu_item.name}, Quantity: {item.quantity}, Total Price: PKR {item.total_price:.2f}")
 
+    page_nav("admin_orders", next_cursor)
+
 
 def view_archived_orders():
     st.header("📦 Archived Orders")
 
-    # Fetch all archived orders
-    archived_orders = session.query(ArchivedOrder).all()
+    # Fetch one page of archived orders from the replica, if configured
+    page_size, start, end, cursor = page_filters("archived_orders")
+    archived_orders, next_cursor = archived_order_page(read_session, page_size, after=cursor, start=start, end=end)
 
     if not archived_orders:
         st.info("No archived orders found.")
@@ -259,11 +422,11 @@ def view_archived_orders():
             st.write(f"**Archived At**: {archived.archive_time}")
 
             st.write("**Order Items:**")
-            items = session.query(ArchivedOrderItems).filter_by(order_id=archived.order_id).all()
+            # Items and names were loaded with the page; prefer the name snapshotted at archive time
+            items = archived.items
             if items:
                 for item in items:
-                    menu_item = session.query(MenuItem).filter_by(item_id=item.menu_item_id).first()
-                    item_name = menu_item.name if menu_item else "Unknown Item"
+                    item_name = item.item_name or (item.menu_item.name if item.menu_item else "Unknown Item")
                     st.write(f"- {item_name}: Quantity {item.quantity}, Total PKR {item.total_price:.2f}")
             else:
                 st.write("No items found.")
@@ -276,70 +439,70 @@ def view_archived_orders():
             if confirm:
                 if st.button("🗑️ Permanently Delete", key=delete_key):
                     try:
-                        session.query(ArchivedOrderItems).filter_by(order_id=archived.order_id).delete()
-                        session.query(ArchivedOrder).filter_by(order_id=archived.order_id).delete()
-                        session.commit()
+                        # Also takes the order back out of the sales rollups
+                        delete_archived_order(session, archived)
                         st.success(f"Archived Order {archived.order_id} permanently deleted.")
                         st.rerun()
                     except Exception as e:
-                        session.rollback()
                         st.error(f"Failed to delete archived order {archived.order_id}. Error: {e}")
             else:
                 st.warning("⚠️ Please confirm the checkbox to enable deletion.")
 
+    page_nav("archived_orders", next_cursor)
+
 def add_reservation():
     st.header("➕ Add New Reservation")
 
     # Fetch only Customer-role users
-    customers = session.query(User).filter_by(role="Customer").all()
-    if not customers:
+    customer_list = customers(session)
+    if not customer_list:
         st.info("No customers found. Please add customers first.")
         return
 
     # Build a map of customer names → user_ids
-    customer_map = {cust.name: cust.user_id for cust in customers}
+    customer_map = {cust.name: cust.user_id for cust in customer_list}
 
     # Get list of all tables for validation
-    tables = {t.table_id: t for t in session.query(Table).all()}
+    tables = {t.table_id: t for t in all_tables(session)}
     if not tables:
         st.info("No tables defined. Please set up tables first.")
         return
 
+    auto_label = "Best available table"
+    table_labels = {f"Table {tid} (seats {t.capacity})": tid for tid, t in tables.items()}
     with st.form("add_reservation_form"):
         selected_name = st.selectbox("Customer Name", list(customer_map.keys()))
-        table_id       = st.number_input("Table ID", min_value=1, format="%d")
+        party_size     = st.number_input("Party Size", min_value=1, value=2, format="%d")
+        table_choice   = st.selectbox("Table", [auto_label] + list(table_labels.keys()))
         res_date       = st.date_input("Reservation Date")
         res_time       = st.time_input("Reservation Time")
+        duration       = st.number_input("Duration (minutes)", min_value=15, step=15,
+                                         max_value=int(MAX_DURATION.total_seconds() // 60),
+                                         value=int(DEFAULT_DURATION.total_seconds() // 60))
         status         = st.selectbox("Status", ["Confirmed", "Cancelled", "No-Show"])
         submitted      = st.form_submit_button("Add Reservation")
 
     if submitted:
-        # Check table exists
-        table = tables.get(table_id)
-        if not table:
-            st.error(f"❌ Table {table_id} does not exist.")
-            return
-
-        # Check if table is available
-        if not table.availability:
-            st.error(f"❌ Table {table_id} is already reserved or occupied.")
-            return
-
         # Combine date & time into a single datetime
         reservation_datetime = datetime.combine(res_date, res_time)
-
-        # Create reservation
-        new_res = Reservation(
-            user_id=customer_map[selected_name],
-            table_id=table_id,
-            reservation_time=reservation_datetime,
-            status=status
-        )
-        session.add(new_res)
-
-        # Mark table unavailable
-        table.availability = False
-        session.commit()
+        length = timedelta(minutes=duration)
+
+        if table_choice == auto_label:
+            table = find_best_table(session, party_size, reservation_datetime, reservation_datetime + length)
+            if not table:
+                st.error(f"❌ No free table seats {party_size} at that time.")
+                return
+            table_id = table.table_id
+        else:
+            table_id = table_labels[table_choice]
+
+        # Checks capacity and overlapping bookings, then commits
+        try:
+            new_res = book_table(session, customer_map[selected_name], table_id, reservation_datetime,
+                                 duration=length, party_size=party_size, status=status)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            return
 
         st.success(f"✅ Reservation #{new_res.reservation_id} added for {selected_name} at Table {table_id}!")
         st.rerun()
@@ -349,7 +512,8 @@ def add_reservation():
 # 2. VIEW ALL RESERVATIONS
 def view_reservations():
     st.header("📋 All Table Reservations")
-    reservations = session.query(Reservation).order_by(Reservation.reservation_time.desc()).all()
+    page_size, start, end, cursor = page_filters("reservations")
+    reservations, next_cursor = reservation_page(session, page_size, after=cursor, start=start, end=end)
     if not reservations:
         st.info("No reservations found.")
         return
@@ -364,15 +528,14 @@ def view_reservations():
         )
         st.divider()
 
+    page_nav("reservations", next_cursor)
+
 
 # 3. TODAY'S BOOKINGS
 def todays_bookings():
     st.header("📅 Today's Reservations")
-    today = date.today()
-    today_res = session.query(Reservation) \
-        .filter(func.date(Reservation.reservation_time) == today) \
-        .order_by(Reservation.reservation_time) \
-        .all()
+    # Range on reservation_time (start of today to start of tomorrow) so the index is used
+    today_res = reservations_on(session, date.today())
 
     if not today_res:
         st.info("No bookings for today.")
@@ -388,6 +551,29 @@ def todays_bookings():
         )
         st.divider()
 
+
+# 4. UPCOMING BOOKINGS
+def upcoming_bookings():
+    st.header("⏭ Upcoming Reservations")
+    hours = st.slider("Next hours", 1, 24, 3, key="upcoming_hours")
+    upcoming = upcoming_reservations(session, hours)
+
+    if not upcoming:
+        st.info(f"No bookings in the next {hours} hour(s).")
+        return
+
+    for r in upcoming:
+        st.markdown(
+            f"• *Reservation #{r.reservation_id}*  \n"
+            f"User ID: {r.user_id}  \n"
+            f"Table: {r.table_id}  \n"
+            f"Time: {r.reservation_time.strftime('%Y-%m-%d %H:%M')}"
+            f"{' – ' + r.end_time.strftime('%H:%M') if r.end_time else ''}  \n"
+            f"Party: {r.party_size or '-'}  \n"
+            f"Status: {r.status}"
+        )
+        st.divider()
+
 def inventory():
     st.header("📦 Add Inventory Item")
     with st.form("add_inventory"):
@@ -396,15 +582,103 @@ def inventory():
         expiry = st.date_input("Expiry Date", value=date.today())
         supplier = st.number_input("Supplier ID", min_value=1)
         if st.form_submit_button("Add Item"):
-            stock = Inventory(name=name, quantity=qty, expiry_date=expiry, supplier_id=supplier)
-            session.add(stock)
-            session.commit()
+            # Opening stock is logged to the stock ledger as a receipt
+            add_stock_item(session, name, qty, expiry_date=expiry, supplier_id=supplier)
             st.success("Inventory item added!")
 
-    st.subheader("📦 Current Inventory")
-    inventory = session.query(Inventory).all()
-    for i in inventory:
-        st.write(f"{i.name} | Qty: {i.quantity} | Expires: {i.expiry_date}")
+    items_in_stock = stock_items(session)
+    stock_labels = {f"{i.name} (#{i.item_id})": i.item_id for i in items_in_stock}
+
+    with st.expander("📥 Restock Item"):
+        with st.form("restock_inventory"):
+            restock_label = st.selectbox("Item", list(stock_labels.keys()))
+            restock_qty = st.number_input("Quantity received", min_value=1)
+            if st.form_submit_button("Restock") and restock_label:
+                # Logged as a receipt; puts dishes switched off for lack of this stock back on the menu
+                if receive_stock(session, stock_labels[restock_label], restock_qty):
+                    bump_menu_version()
+                st.success(f"Restocked {restock_label}.")
+
+    with st.expander("🗑 Record Waste"):
+        with st.form("record_waste"):
+            waste_label = st.selectbox("Item", list(stock_labels.keys()), key="waste_item")
+            waste_qty = st.number_input("Quantity wasted", min_value=1)
+            if st.form_submit_button("Write Off") and waste_label:
+                # Dishes this leaves without a portion's worth are taken off the menu
+                wasted, menu_changed = record_waste(session, stock_labels[waste_label], waste_qty)
+                if menu_changed:
+                    bump_menu_version()
+                st.success(f"Wrote off {wasted} of {waste_label}.")
+
+    with st.expander("🕓 Stock at a Point in Time"):
+        c1, c2 = st.columns(2)
+        with c1:
+            at_date = st.date_input("Date", value=date.today(), key="stock_at_date")
+        with c2:
+            at_time = st.time_input("Time (UTC)", key="stock_at_time")
+        # Nearest snapshot plus the ledger entries after it
+        past_stock = stock_at(session, datetime.combine(at_date, at_time))
+        names = {i.item_id: i.name for i in items_in_stock}
+        for item_id, quantity in sorted(past_stock.items()):
+            st.write(f"{names.get(item_id, f'Item #{item_id}')} | Qty: {quantity}")
+
+    with st.expander("🧾 Recipes"):
+        menu_labels = {f"{m.name} (#{m.item_id})": m.item_id for m in cached_menu(session)}
+        with st.form("add_recipe_item"):
+            recipe_menu = st.selectbox("Menu Item", list(menu_labels.keys()))
+            recipe_stock = st.selectbox("Uses Inventory Item", list(stock_labels.keys()))
+            recipe_qty = st.number_input("Quantity per portion", min_value=1)
+            if st.form_submit_button("Save Ingredient") and recipe_menu and recipe_stock:
+                set_recipe_item(session, menu_labels[recipe_menu], stock_labels[recipe_stock], recipe_qty)
+                st.success("Recipe updated.")
+        for r in recipe_lines(session):
+            st.write(f"{r.menu_item.name} ← {r.quantity} x {r.inventory_item.name}")
+
+    st.subheader("📦 Inventory Dashboard")
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        within_days = st.number_input("Expiring within (days)", min_value=0, value=3, key="inv_expiry_days")
+    with c2:
+        threshold = st.number_input("Reorder below quantity", min_value=1, value=10, key="inv_threshold")
+    with c3:
+        target = st.number_input("Reorder up to quantity", min_value=1, value=50, key="inv_target")
+
+    expiring_tab, low_tab, reorder_tab, all_tab = st.tabs(["⏰ Expiring", "📉 Low Stock", "🚚 Reorder by Supplier", "📋 All Items"])
+
+    with expiring_tab:
+        expiring = expiring_items(session, within_days)
+        if not expiring:
+            st.info("Nothing expires in that window.")
+        for i in expiring:
+            label = "❌ Expired" if i.expiry_date < date.today() else "⏰ Expires"
+            st.write(f"{i.name} | Qty: {i.quantity} | {label}: {i.expiry_date}")
+
+    with low_tab:
+        low = low_stock_items(session, threshold)
+        if not low:
+            st.info("All items are above the reorder level.")
+        for i in low:
+            st.write(f"{i.name} | Qty: {i.quantity} | Supplier: {i.supplier_id}")
+
+    with reorder_tab:
+        try:
+            reorders = reorder_lists(session, threshold, target)
+        except ValueError as e:
+            st.error(str(e))
+            reorders = None
+        if reorders == []:
+            st.info("Nothing to reorder.")
+        for supplier_id, count, units, lines in reorders:
+            with st.expander(f"Supplier {supplier_id if supplier_id is not None else 'N/A'}: {count} item(s), {units} unit(s)"):
+                for item_name, quantity, order_qty in lines:
+                    st.write(f"• {item_name}: have {quantity}, order {order_qty}")
+
+    with all_tab:
+        page_size, _, _, cursor = page_filters("inventory", dates=False)
+        items, next_cursor = inventory_page(session, page_size, after=cursor)
+        for i in items:
+            st.write(f"{i.name} | Qty: {i.quantity} | Expires: {i.expiry_date}")
+        page_nav("inventory", next_cursor)
 
 def feedback():
     st.header("⭐ Submit Feedback")
@@ -416,48 +690,77 @@ def feedback():
         return
 
     # Fetch orders placed by the logged-in user
-    user_orders = session.query(Order).filter(Order.user_id == user_id).all()
+    user_orders = customer_orders(session, user_id)
     if not user_orders:
         st.info("You haven't placed any orders yet.")
-        return
+    else:
+        order_options = {f"Order #{o.order_id} - ₹{o.total_amount} on {o.order_time.strftime('%Y-%m-%d %H:%M')}": o.order_id for o in user_orders}
 
-    order_options = {f"Order #{o.order_id} - ₹{o.total_amount} on {o.order_time.strftime('%Y-%m-%d %H:%M')}": o.order_id for o in user_orders}
+        with st.form("add_feedback"):
+            order_label = st.selectbox("Select Order", list(order_options.keys()))
+            selected_order_id = order_options[order_label]
+            rating = st.slider("Rating", 1, 5)
+            comments = st.text_area("Comments")
 
-    with st.form("add_feedback"):
-        order_label = st.selectbox("Select Order", list(order_options.keys()))
-        selected_order_id = order_options[order_label]
-        rating = st.slider("Rating", 1, 5)
-        comments = st.text_area("Comments")
+            if st.form_submit_button("Submit Feedback"):
+                # Rating rollups are updated in the same commit
+                submit_feedback(session, user_id, selected_order_id, rating, comments)
+                st.success("Thanks for your feedback!")
 
-        if st.form_submit_button("Submit Feedback"):
-            fb = Feedback(
-                user_id=user_id,
-                order_id=selected_order_id,
-                rating=rating,
-                comments=comments
-            )
-            session.add(fb)
-            session.commit()
-            st.success("Thanks for your feedback!")
+    if st.session_state.get("user_role") == "Admin":
+        rating_stats()
 
     st.subheader("🗣 Customer Feedback")
 
-    feedbacks = session.query(Feedback).order_by(Feedback.feedback_id.desc()).all()
+    # One page at a time, with the customer and order joined into the same query (replica, if configured)
+    page_size, _, _, cursor = page_filters("feedback", dates=False)
+    feedbacks, next_cursor = feedback_page(read_session, page_size, after=cursor)
 
     if not feedbacks:
         st.info("No feedback has been submitted yet.")
     else:
         for f in feedbacks:
-            user = session.query(User).filter(User.user_id == f.user_id).first()
-            order = session.query(Order).filter(Order.order_id == f.order_id).first()
+            user = f.user
+            order = f.order
 
             st.markdown("---")
             st.markdown(f"**👤 Customer:** {user.name if user else 'Unknown'}")
-            st.markdown(
-                f"**🧾 Order ID:** #{f.order_id}  •  💵 Total: PKR{order.total_amount:.2f}  •  🕒 {order.order_time.strftime('%Y-%m-%d %H:%M') if order else 'N/A'}")
+            if order:
+                st.markdown(
+                    f"**🧾 Order ID:** #{f.order_id}  •  💵 Total: PKR{order.total_amount:.2f}  •  🕒 {order.order_time.strftime('%Y-%m-%d %H:%M')}")
+            else:
+                st.markdown(f"**🧾 Order ID:** #{f.order_id}  •  N/A")
             st.markdown(f"**⭐ Rating:** {f.rating}/5")
             st.markdown(f"**💬 Comments:**\n> {f.comments}")
 
+        page_nav("feedback", next_cursor)
+
+
+def rating_stats():
+    """Admin-only rating overview, read from the precomputed rating rollups."""
+    st.subheader("📊 Rating Overview")
+    if st.button("♻️ Rebuild Rating Stats"):
+        recompute_rating_rollups(session)
+
+    days = daily_ratings(read_session, limit=30)
+    if not days:
+        st.info("No ratings yet.")
+        return
+
+    chart = pd.DataFrame(days, columns=["Day", "Average Rating", "Ratings"]).set_index("Day")
+    st.line_chart(chart["Average Rating"])
+
+    min_count = st.number_input("Minimum ratings per item", min_value=1, value=5, key="rating_min_count")
+    c1, c2 = st.columns(2)
+    with c1:
+        st.markdown("**👍 Best Rated Items**")
+        for name, avg, count in item_ratings(read_session, min_count=min_count, best=True):
+            st.write(f"• {name or 'Unknown Item'}: {avg:.2f}/5 ({count} ratings)")
+    with c2:
+        st.markdown("**👎 Lowest Rated Items**")
+        for name, avg, count in item_ratings(read_session, min_count=min_count, best=False):
+            st.write(f"• {name or 'Unknown Item'}: {avg:.2f}/5 ({count} ratings)")
+
 
 def sales_report():
     st.header("📈 Sales & Performance Dashboard")
@@ -476,11 +779,8 @@ def sales_report():
     else:
         st.warning("⚠️ This will delete ALL orders and line items permanently!")
         if st.button("✅ Confirm Clear All Sales Data"):
-            # Delete all order items first
-            session.query(OrderItems).delete(synchronize_session=False)
-            # Then delete all orders
-            session.query(Order).delete(synchronize_session=False)
-            session.commit()
+            # Deletes every order and line item; rollups then only reflect archived orders
+            clear_orders(session)
             st.success("All sales data has been cleared.")
             # Reset confirmation flag and rerun to show zero metrics
             st.session_state.confirm_clear_sales = False
@@ -488,35 +788,175 @@ def sales_report():
         if st.button("❌ Cancel"):
             st.session_state.confirm_clear_sales = False
 
-    # Ensure we fetch fresh counts
-    session.expire_all()
-
-    # --- Overall Metrics ---
-    total_sales = session.query(func.sum(Order.total_amount)).scalar() or 0
-    total_orders = session.query(func.count(Order.order_id)).scalar() or 0
-    st.metric("Total Revenue", f"PKR {total_sales:.2f}")
-    st.metric("Total Orders", total_orders)
+    if st.button("♻️ Rebuild Rollups", help="Recompute the dashboard from all current and archived orders"):
+        recompute_sales_rollups(session)
+        st.success("Sales rollups rebuilt.")
+
+    # Add the sales queued by orders since the last visit, then fetch fresh counts;
+    # the dashboard reads from the replica, if configured
+    fold_pending_sales(session)
+    read_session.expire_all()
+
+    # --- Overall Metrics (current + archived orders, read from the 'all' rollup) ---
+    total_orders, total_items, total_sales = sales_totals(read_session)
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Total Revenue", f"PKR {total_sales:.2f}")
+    c2.metric("Total Orders", total_orders)
+    c3.metric("Items Sold", total_items)
+
+    # --- Revenue over time ---
+    st.subheader("📊 Revenue & Volume Over Time")
+    periods = {"Hourly": "hour", "Daily": "day", "Weekly": "week"}
+    c1, c2 = st.columns([2, 1])
+    with c1:
+        period_label = st.radio("Bucket", list(periods.keys()), index=1, horizontal=True, key="sales_period")
+    with c2:
+        limit = st.number_input("Buckets to show", min_value=1, max_value=365, value=30, key="sales_buckets")
+
+    series = sales_series(read_session, periods[period_label], limit)
+    if series:
+        chart = pd.DataFrame(
+            [(r.bucket_start, float(r.revenue or 0), r.item_count, r.order_count) for r in series],
+            columns=["Bucket", "Revenue", "Items Sold", "Orders"],
+        ).set_index("Bucket")
+        st.bar_chart(chart["Revenue"])
+        st.line_chart(chart[["Items Sold", "Orders"]])
+    else:
+        st.info("No sales recorded yet.")
+
+    # --- Export for the accountants ---
+    with st.expander("⬇️ Export Data"):
+        labels = {"Orders": "orders", "Order Items": "order_items",
+                  "Archived Orders": "archived_orders", "Archived Order Items": "archived_order_items"}
+        c1, c2, c3, c4 = st.columns(4)
+        with c1:
+            dataset = labels[st.selectbox("Data", list(labels.keys()), key="export_dataset")]
+        with c2:
+            fmt = st.selectbox("Format", FORMATS, format_func=str.upper, key="export_format")
+        with c3:
+            export_start = st.date_input("From", value=date.today() - timedelta(days=30), key="export_start")
+        with c4:
+            export_end = st.date_input("To", value=date.today(), key="export_end")
+
+        def build_export():
+            # Runs on its own thread when the button is clicked, so it gets its own session;
+            # rows are streamed in batches into a temporary file
+            with ReadSession.session_factory() as export_session:
+                return export_file(export_session, dataset, fmt, export_start, export_end)
+
+        st.download_button("Download", data=build_export,
+                           file_name=f"{dataset}_{export_start}_{export_end}.{fmt}",
+                           mime="text/csv" if fmt == "csv" else "application/octet-stream")
+        if "parquet" not in FORMATS:
+            st.caption("Install pyarrow to enable Parquet export.")
 
     # --- Top‐Selling Items ---
     st.subheader("🥇 Top-Selling Menu Items")
     try:
-        top_items = (
-            session.query(MenuItem.name, func.sum(OrderItems.quantity).label("total_sold"))
-            .join(OrderItems, MenuItem.item_id == OrderItems.item_id)
-            .group_by(MenuItem.name)
-            .order_by(func.sum(OrderItems.quantity).desc())
-            .limit(10)
-            .all()
-        )
+        best_sellers = top_items(read_session, limit=10)
 
-        if top_items:
-            for name, count in top_items:
-                st.write(f"• {name}: {int(count)} sold")
+        if best_sellers:
+            for name, count, revenue in best_sellers:
+                st.write(f"• {name or 'Unknown Item'}: {int(count)} sold (PKR {revenue:.2f})")
         else:
             st.info("No orders placed yet.")
     except Exception as e:
         st.warning(f"⚠️ Error loading top items: {e}")
 
+    menu_engineering_report()
+
+
+def menu_engineering_report():
+    """Admin menu-engineering charts, computed with pandas/NumPy in analytics.py and cached per date range."""
+    st.subheader("🍽 Menu Engineering")
+    c1, c2 = st.columns(2)
+    with c1:
+        start = st.date_input("From", value=date.today() - timedelta(days=30), key="analytics_start")
+    with c2:
+        end = st.date_input("To", value=date.today(), key="analytics_end")
+    if start > end:
+        st.error("The start date must be before the end date.")
+        return
+
+    report = menu_analytics(read_session, start, end)
+    if not report.lines:
+        st.info("No orders in that range.")
+        return
+    st.caption(f"{report.orders} orders, {report.lines} line items. Margin is approximated by the average "
+               "selling price, since food costs aren't recorded.")
+
+    quadrants_tab, pairs_tab, hours_tab = st.tabs(["⭐ Popularity vs Margin", "🧺 Ordered Together", "🕒 Busy Hours"])
+    with quadrants_tab:
+        eng = report.engineering
+        st.scatter_chart(eng, x="share", y="margin", color="quadrant", size="revenue")
+        st.dataframe(
+            eng[["name", "quadrant", "units", "revenue", "share", "margin"]]
+            .rename(columns={"name": "Item", "quadrant": "Quadrant", "units": "Units", "revenue": "Revenue",
+                             "share": "Share of Units", "margin": "Avg Price"}),
+            hide_index=True,
+        )
+    with pairs_tab:
+        if report.pairs.empty:
+            st.info("No items were ordered together in that range.")
+        else:
+            st.dataframe(report.pairs.rename(columns={
+                "item_a": "Item", "item_b": "Ordered With", "orders": "Orders", "support": "Support",
+                "confidence": "Confidence", "lift": "Lift",
+            }), hide_index=True)
+    with hours_tab:
+        heat = report.heatmap.reset_index(names="Day").melt(id_vars="Day", var_name="Hour", value_name="Orders")
+        st.altair_chart(
+            alt.Chart(heat).mark_rect().encode(
+                x=alt.X("Hour:O"), y=alt.Y("Day:O", sort=DAYS), color=alt.Color("Orders:Q"),
+                tooltip=["Day", "Hour", "Orders"],
+            )
+        )
+
+
+def performance():
+    """Admin-only SQL stats per page, recorded by the engine hooks in perf.py for this process."""
+    st.header("⏱ Performance")
+    st.caption(f"Statements repeated {N_PLUS_ONE_MIN}+ times in one run are flagged as possible N+1 queries.")
+    if st.button("🧹 Reset Stats"):
+        reset_stats()
+
+    pages = page_stats()
+    if not pages:
+        st.info("No page runs recorded yet.")
+        return
+
+    st.dataframe(pd.DataFrame([
+        {
+            "Page": p.page,
+            "Runs": p.runs,
+            "Avg Statements": round(p.statements / p.runs, 1),
+            "Avg DB ms": round(p.db_time / p.runs * 1000, 1),
+            "Worst DB ms": round(p.worst_db_time * 1000, 1),
+            "N+1 Flags": sum(p.n_plus_one.values()),
+        }
+        for p in pages
+    ]), hide_index=True)
+
+    for p in pages:
+        with st.expander(f"{p.page}: slowest statements"):
+            for elapsed, shape in p.slowest:
+                st.markdown(f"**{elapsed * 1000:.1f} ms**")
+                st.code(shape, language="sql")
+            for shape, runs in p.n_plus_one.most_common():
+                st.warning(f"Possible N+1 in {runs} run(s):")
+                st.code(shape, language="sql")
+
+    st.subheader("Recent Runs")
+    st.dataframe(pd.DataFrame([
+        {
+            "Page": r.page,
+            "Statements": r.statements,
+            "DB ms": round(r.db_time * 1000, 1),
+            "N+1": len(r.n_plus_one()),
+        }
+        for r in recent_runs()
+    ]), hide_index=True)
+
 
 def user_management():
     st.subheader("👥 User Management")
@@ -525,32 +965,39 @@ def user_management():
     if "pending_delete_user" not in st.session_state:
         st.session_state.pending_delete_user = None
 
-    users = session.query(User).all()
-    for user in users:
+    search = st.text_input("🔍 Search by name or email", key="user_search",
+                           on_change=_reset_pages, args=("users",))
+    page_size, _, _, cursor = page_filters("users", dates=False)
+
+    # Order counts come from a COUNT subquery, not by loading each user's orders
+    users, next_cursor = user_page(session, page_size, after=cursor, search=search)
+    if not users:
+        st.info("No users found.")
+    for user, order_count in users:
         col1, col2 = st.columns([5, 1])
         with col1:
             st.markdown(
                 f"**🆔 ID:** {user.user_id}  \n"
                 f"**👤 Name:** {user.name}  \n"
                 f"**🔐 Role:** {user.role}  \n"
-                f"**📦 Orders:** {len(user.orders)}"
+                f"**📦 Orders:** {order_count}"
             )
         with col2:
             # When you click delete, set that user as pending
             if st.button("🗑️", key=f"del_user_{user.user_id}"):
                 st.session_state.pending_delete_user = user.user_id
+    page_nav("users", next_cursor)
 
     # Outside the loop: if someone clicked delete, ask confirmation
     pid = st.session_state.pending_delete_user
     if pid is not None:
-        user = session.get(User, pid)
+        user = get_user(session, pid)
         if user:
             st.warning(f"⚠️ Are you sure you want to delete **{user.name}** and all their data?")
             c1, c2 = st.columns(2)
             with c1:
                 if st.button("✅ Yes, delete", key="confirm_delete"):
-                    session.delete(user)
-                    session.commit()
+                    delete_user(session, user.user_id)
                     st.success(f"User **{user.name}** and all their data deleted.")
                     # reset and refresh
                     st.session_state.pending_delete_user = None
@@ -569,9 +1016,7 @@ def user_management():
             role = st.selectbox("Role", ["Admin", "Staff", "Receptionist", "Customer"])
             submitted = st.form_submit_button("Add User")
             if submitted:
-                new_user = User(name=name, role=role)
-                session.add(new_user)
-                session.commit()
+                create_user(session, name, role)
                 st.success(f"User **{name}** added successfully!")
                 st.rerun()
 
@@ -588,21 +1033,13 @@ def sign_up():
             if not all([name, email, contact, password]):
                 st.error("All fields are required.")
             else:
-                new_user = User(
-                    name=name,
-                    role="Customer",
-                    contact=contact,
-                    email=email,
-                    password=password
-                )
-                session.add(new_user)
                 try:
-                    session.commit()
+                    # The password is hashed before it is stored
+                    create_user(session, name, "Customer", contact=contact, email=email, password=password)
                     st.success("Account created! Please log in below.")
                     st.session_state.show_signup = False
-                except IntegrityError:
-                    session.rollback()
-                    st.error("That email is already registered.")
+                except ValueError as e:
+                    st.error(str(e))
     st.markdown("---")
     if st.button("← Back to Login"):
         st.session_state.show_signup = False
@@ -615,7 +1052,14 @@ def log_in():
         password = st.text_input("🔒 Password", type="password", placeholder="••••••••")
         submitted = st.form_submit_button("Login")
         if submitted:
-            user = session.query(User).filter_by(email=email, password=password).first()
+            # Hash check runs on a bounded worker pool; repeated failures are rate limited per email
+            error = "❌ Invalid email or password"
+            try:
+                user = authenticate(session, email, password)
+            except ValueError as e:
+                user, error = None, f"🔒 {e}"
+            except TimeoutError:
+                user, error = None, "⏳ Lots of people are logging in right now. Please try again in a moment."
             if user:
                 st.session_state.logged_in = True
                 st.session_state.user_role = user.role
@@ -624,7 +1068,7 @@ def log_in():
                 st.success(f"Welcome, {user.name} ({user.role})!")
                 st.rerun()
             else:
-                st.error("❌ Invalid email or password")
+                st.error(error)
     st.markdown("---")
     if st.button("Create an account"):
         st.session_state.show_signup = True
@@ -662,17 +1106,18 @@ st.sidebar.markdown(f"### 👤 {name} ({role})")
 
 # Define role-specific menus
 if role == "Admin":
-    menu_options = ["Track Orders", "Order Management", "Archived Orders", "Menu Management", "Reservations", "Sales Report", "Inventory", "User Management", "Feedback"]
+    menu_options = ["Track Orders", "Order Management", "Archived Orders", "Menu Management", "Reservations", "Sales Report", "Inventory", "User Management", "Feedback", "Performance"]
 elif role == "Receptionist":
-    menu_options = ["Place Order", "Track Orders", "Add Reservation", "View Reservations", "Today's Bookings"]
+    menu_options = ["Place Order", "Track Orders", "Add Reservation", "View Reservations", "Today's Bookings", "Upcoming Bookings"]
 elif role == "Staff":
-    menu_options = ["Track Orders", "Update Order Status", "View Reservations"]
+    menu_options = ["Track Orders", "Update Order Status", "Kitchen Display", "View Reservations"]
 elif role == "Customer":
     menu_options = ["Place Order", "Track My Orders", "Give Feedback"]
 else:
     menu_options = []
 
 menu = st.sidebar.radio("📁 Select Section", menu_options)
+name_run(menu)
 st.markdown(f"### Hello, {name} ({role})")
 
 # -------------------- ADMIN PANEL --------------------
@@ -711,6 +1156,9 @@ if role == "Admin":
         # Calls your modular feedback function
         feedback()
 
+    elif menu == "Performance":
+        performance()
+
 
 # -------------------- RECEPTIONIST PANEL --------------------
 elif role == "Receptionist":
@@ -729,6 +1177,9 @@ elif role == "Receptionist":
     elif menu == "Today's Bookings":
         todays_bookings()
 
+    elif menu == "Upcoming Bookings":
+        upcoming_bookings()
+
 # -------------------- STAFF PANEL --------------------
 elif role == "Staff":
     if menu == "Track Orders":
@@ -737,6 +1188,9 @@ elif role == "Staff":
     elif menu == "Update Order Status":
         update_order_status()
 
+    elif menu == "Kitchen Display":
+        kitchen_display()
+
     elif menu == "View Reservations":
         view_reservations()
 
@@ -753,3 +1207,8 @@ elif role == "Customer":
     elif menu == "Give Feedback":
         # Uses your customer_feedback() function
         feedback()
+
+# Hand this run's connections back to the pool
+end_run()
+Session.remove()
+ReadSession.remove()
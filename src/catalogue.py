@@ -0,0 +1,275 @@
+import csv
+import io
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from sqlalchemy import delete, insert, select, update
+from models import MenuItem, MenuPriceChange, OrderItems, RecipeItem
+
+CATEGORIES = ["Starter", "Main Course", "Drink", "Dessert"]
+
+# Longest a process may serve a cached menu before re-reading it, so edits
+# made by other workers show up within this many seconds
+MENU_CACHE_TTL = float(os.environ.get("KHATA_MENU_CACHE_TTL", "60"))
+
+# Plain, immutable rows so cached entries can be shared across sessions and threads
+MenuEntry = namedtuple("MenuEntry", ["item_id", "name", "category", "price", "availability", "ingredients"])
+
+_lock = threading.Lock()
+_version = 0
+_cache = {}  # available_only -> (version, loaded_at, entries)
+
+
+def bump_menu_version():
+    """Invalidate the cached menu in this process; call after any menu edit."""
+    global _version
+    with _lock:
+        _version += 1
+
+
+def add_menu_item(session, name, category, price, availability=True, ingredients=None):
+    """Add a menu item with its first price-history entry, commit and invalidate the cached menu."""
+    item = MenuItem(name=name, category=category, price=price, availability=availability, ingredients=ingredients)
+    session.add(item)
+    session.flush()
+    session.add(MenuPriceChange(item_id=item.item_id, new_price=price, source="add"))
+    session.commit()
+    bump_menu_version()
+    return item
+
+
+def delete_menu_item(session, item_id):
+    """Delete a menu item if it still exists, commit and invalidate the cached menu."""
+    item = session.get(MenuItem, item_id)
+    if item:
+        session.delete(item)
+        session.commit()
+    bump_menu_version()
+
+
+def cached_menu(session, available_only=False):
+    """Return the menu as a tuple of MenuEntry sorted by name, served from memory while fresh."""
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(available_only)
+        if hit and hit[0] == _version and now - hit[1] < MENU_CACHE_TTL:
+            return hit[2]
+        version = _version
+
+    query = session.query(MenuItem.item_id, MenuItem.name, MenuItem.category, MenuItem.price,
+                          MenuItem.availability, MenuItem.ingredients)
+    if available_only:
+        query = query.filter(MenuItem.availability == True)
+    entries = tuple(MenuEntry(*row) for row in query.order_by(MenuItem.name))
+
+    with _lock:
+        # Don't overwrite a fresher entry if the menu was edited while we were reading
+        if version == _version:
+            _cache[available_only] = (version, now, entries)
+    return entries
+
+
+# --- Bulk import and repricing ---
+
+IMPORT_FIELDS = ("name", "category", "price", "availability", "ingredients")
+_TRUE = {"yes", "y", "true", "1", "available"}
+_FALSE = {"no", "n", "false", "0", "unavailable"}
+
+# added: [row dict]; changed: [(item_id, name, {field: (old, new)})]; unchanged: count
+MenuDiff = namedtuple("MenuDiff", ["added", "changed", "unchanged"])
+
+
+def parse_menu_file(data, file_name):
+    """Rows (dicts of the IMPORT_FIELDS present, plus optional item_id) from CSV or JSON bytes."""
+    text = data.decode("utf-8-sig")
+    if file_name.lower().endswith(".json"):
+        rows = json.loads(text)
+        if isinstance(rows, dict):
+            rows = rows.get("items", [])
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise ValueError("JSON must be a list of objects (or {\"items\": [...]}).")
+    else:
+        rows = list(csv.DictReader(io.StringIO(text)))
+    return [
+        {k.strip().lower(): v for k, v in row.items() if k and v not in (None, "")}
+        for row in rows
+    ]
+
+
+def validate_menu_rows(rows):
+    """Clean every row in place and return [(row_number, message)] for all problems found.
+
+    Nothing should be applied unless this returns an empty list.
+    """
+    errors = []
+    seen = {}
+    for n, row in enumerate(rows, start=1):
+        if "item_id" in row:
+            try:
+                row["item_id"] = int(row["item_id"])
+            except (TypeError, ValueError):
+                errors.append((n, f"item_id {row['item_id']!r} is not a number"))
+        name = str(row.get("name", "")).strip()
+        if not name and "item_id" not in row:
+            errors.append((n, "name is required"))
+        if name:
+            row["name"] = name
+            if name.lower() in seen:
+                errors.append((n, f"duplicate of row {seen[name.lower()]} ({name})"))
+            seen[name.lower()] = n
+        if "category" in row and row["category"] not in CATEGORIES:
+            errors.append((n, f"category must be one of {', '.join(CATEGORIES)}"))
+        if "price" in row:
+            try:
+                row["price"] = Decimal(str(row["price"])).quantize(Decimal("0.01"), ROUND_HALF_UP)
+                if row["price"] < 0:
+                    errors.append((n, "price can't be negative"))
+            except InvalidOperation:
+                errors.append((n, f"price {row['price']!r} is not a number"))
+        if "availability" in row and not isinstance(row["availability"], bool):
+            value = str(row["availability"]).strip().lower()
+            if value in _TRUE or value in _FALSE:
+                row["availability"] = value in _TRUE
+            else:
+                errors.append((n, f"availability {row['availability']!r} should be yes or no"))
+        for field in row.keys() - set(IMPORT_FIELDS) - {"item_id"}:
+            errors.append((n, f"unknown column {field!r}"))
+    return errors
+
+
+def diff_menu(session, rows):
+    """Compare validated rows with the current menu (one query) and return a MenuDiff.
+
+    Rows match an existing item by item_id, else by name (case-insensitively);
+    columns missing from a row are left as they are.
+    """
+    current = session.execute(select(MenuItem.item_id, *(getattr(MenuItem, f) for f in IMPORT_FIELDS))).all()
+    by_id = {r.item_id: r for r in current}
+    by_name = {(r.name or "").lower(): r for r in current}
+
+    added, changed, unchanged = [], [], 0
+    for n, row in enumerate(rows, start=1):
+        existing = by_id.get(row["item_id"]) if "item_id" in row else by_name.get(row["name"].lower())
+        if existing is None:
+            if "item_id" in row:
+                raise ValueError(f"Row {n}: no menu item #{row['item_id']}.")
+            missing = [f for f in ("category", "price") if f not in row]
+            if missing:
+                raise ValueError(f"Row {n}: new item {row['name']} needs {' and '.join(missing)}.")
+            added.append({"availability": True, "ingredients": None, **row})
+            continue
+        changes = {
+            field: (getattr(existing, field), row[field])
+            for field in IMPORT_FIELDS
+            if field in row and getattr(existing, field) != row[field]
+        }
+        if changes:
+            changed.append((existing.item_id, existing.name, changes))
+        else:
+            unchanged += 1
+    return MenuDiff(added, changed, unchanged)
+
+
+def plan_reprice(session, percent, category=None):
+    """MenuDiff that changes every price (in `category`, if given) by `percent`, rounded to 0.01."""
+    factor = 1 + Decimal(str(percent)) / 100
+    query = select(MenuItem.item_id, MenuItem.name, MenuItem.price).where(MenuItem.price.isnot(None))
+    if category:
+        query = query.where(MenuItem.category == category)
+    changed = []
+    for item_id, name, price in session.execute(query):
+        new = (Decimal(price) * factor).quantize(Decimal("0.01"), ROUND_HALF_UP)
+        if new != price:
+            changed.append((item_id, name, {"price": (price, new)}))
+    return MenuDiff([], changed, 0)
+
+
+def apply_menu_diff(session, diff, source="import"):
+    """Apply a MenuDiff in one transaction with one batched statement per kind of change.
+
+    New items are bulk-inserted, changed items bulk-updated by primary key and
+    every new or changed price is appended to menu_price_history. Invalidates
+    the cached menu. Returns (added, changed).
+    """
+    now = datetime.utcnow()
+    history = []
+    try:
+        if diff.added:
+            # Names are unique within a validated file, so RETURNING rows are matched back by name
+            # (asking for parameter order would make some backends insert row by row)
+            ids = dict(session.execute(
+                insert(MenuItem).returning(MenuItem.name, MenuItem.item_id),
+                [{f: row.get(f) for f in IMPORT_FIELDS} for row in diff.added],
+            ).all())
+            history += [
+                {"item_id": ids[row["name"]], "old_price": None, "new_price": row["price"], "source": source,
+                 "changed_at": now}
+                for row in diff.added
+            ]
+
+        # Executemany needs the same keys in every row, so group the updates by changed fields
+        updates = {}
+        for item_id, _, changes in diff.changed:
+            updates.setdefault(tuple(sorted(changes)), []).append(
+                {"item_id": item_id, **{field: new for field, (_, new) in changes.items()}}
+            )
+            if "price" in changes:
+                old, new = changes["price"]
+                history.append({"item_id": item_id, "old_price": old, "new_price": new, "source": source,
+                                "changed_at": now})
+        for rows in updates.values():
+            session.execute(update(MenuItem), rows)
+
+        if history:
+            session.execute(insert(MenuPriceChange), history)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    bump_menu_version()
+    return len(diff.added), len(diff.changed)
+
+
+def delete_menu_items(session, item_ids):
+    """Delete several menu items at once, with the same cascades as delete_menu_item(); commits.
+
+    Line items and recipe rows that use them go too, in one statement per table.
+    """
+    item_ids = list(item_ids)
+    if not item_ids:
+        return 0
+    try:
+        session.execute(delete(OrderItems).where(OrderItems.item_id.in_(item_ids)))
+        session.execute(delete(RecipeItem).where(RecipeItem.menu_item_id.in_(item_ids)))
+        deleted = session.execute(delete(MenuItem).where(MenuItem.item_id.in_(item_ids))).rowcount
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    bump_menu_version()
+    return deleted
+
+
+def price_history(session, item_id=None, limit=50):
+    """[(MenuPriceChange, current item name or None)], newest first."""
+    query = (
+        session.query(MenuPriceChange, MenuItem.name)
+        .outerjoin(MenuItem, MenuItem.item_id == MenuPriceChange.item_id)
+    )
+    if item_id is not None:
+        query = query.filter(MenuPriceChange.item_id == item_id)
+    return query.order_by(MenuPriceChange.changed_at.desc(), MenuPriceChange.change_id.desc()).limit(limit).all()
+
+
+def price_at(session, item_id, moment):
+    """The price item_id had at `moment`, from the price history (None if it had none yet)."""
+    return session.scalar(
+        select(MenuPriceChange.new_price)
+        .where(MenuPriceChange.item_id == item_id, MenuPriceChange.changed_at <= moment)
+        .order_by(MenuPriceChange.changed_at.desc(), MenuPriceChange.change_id.desc())
+        .limit(1)
+    )
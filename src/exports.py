@@ -0,0 +1,135 @@
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime, time, timedelta
+from sqlalchemy import Boolean, Date, DateTime, Integer, Numeric, func, select
+from models import Order, OrderItems, ArchivedOrder, ArchivedOrderItems, MenuItem
+
+# Parquet export needs pyarrow; CSV works without it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# Rows fetched per round trip (and per Parquet row group); memory stays bounded by this
+EXPORT_BATCH_SIZE = int(os.environ.get("KHATA_EXPORT_BATCH_SIZE", "5000"))
+
+FORMATS = ("csv", "parquet") if pq else ("csv",)
+
+
+def _orders():
+    return select(Order.order_id, Order.order_time, Order.user_id, Order.table_id, Order.status,
+                  Order.payment_status, Order.total_amount), Order.order_time, Order.order_id
+
+
+def _order_items():
+    return (
+        select(OrderItems.order_item_id, OrderItems.order_id, Order.order_time, OrderItems.item_id,
+               MenuItem.name.label("item_name"), OrderItems.quantity, OrderItems.total_price)
+        .join(Order, Order.order_id == OrderItems.order_id)
+        .outerjoin(MenuItem, MenuItem.item_id == OrderItems.item_id)
+    ), Order.order_time, OrderItems.order_item_id
+
+
+def _archived_orders():
+    return select(ArchivedOrder.order_id, ArchivedOrder.order_time, ArchivedOrder.archive_time,
+                  ArchivedOrder.user_id, ArchivedOrder.table_id, ArchivedOrder.status, ArchivedOrder.payment_status,
+                  ArchivedOrder.total_amount), ArchivedOrder.order_time, ArchivedOrder.order_id
+
+
+def _archived_order_items():
+    return (
+        select(ArchivedOrderItems.item_id.label("archived_item_id"), ArchivedOrderItems.order_id,
+               ArchivedOrder.order_time, ArchivedOrderItems.menu_item_id,
+               func.coalesce(ArchivedOrderItems.item_name, MenuItem.name).label("item_name"),
+               ArchivedOrderItems.unit_price, ArchivedOrderItems.quantity, ArchivedOrderItems.total_price)
+        .join(ArchivedOrder, ArchivedOrder.order_id == ArchivedOrderItems.order_id)
+        .outerjoin(MenuItem, MenuItem.item_id == ArchivedOrderItems.menu_item_id)
+    ), ArchivedOrder.order_time, ArchivedOrderItems.item_id
+
+
+# Export name -> () -> (select, order_time column to filter on, key to stream in order of)
+EXPORTS = {
+    "orders": _orders,
+    "order_items": _order_items,
+    "archived_orders": _archived_orders,
+    "archived_order_items": _archived_order_items,
+}
+
+
+def export_batches(session, name, start=None, end=None, batch_size=EXPORT_BATCH_SIZE):
+    """(columns, batches) for export `name`, with order_time between the inclusive dates `start`/`end`.
+
+    Rows are streamed with yield_per (a server-side cursor on PostgreSQL), so
+    only one batch of `batch_size` rows is in memory at a time.
+    """
+    stmt, time_col, key = EXPORTS[name]()
+    if start is not None:
+        stmt = stmt.where(time_col >= datetime.combine(start, time.min))
+    if end is not None:
+        stmt = stmt.where(time_col < datetime.combine(end + timedelta(days=1), time.min))
+    stmt = stmt.order_by(key)
+    result = session.execute(stmt.execution_options(yield_per=batch_size))
+    return list(result.keys()), result.partitions()
+
+
+def write_csv(session, name, out, start=None, end=None, batch_size=EXPORT_BATCH_SIZE):
+    """Stream export `name` as CSV with a header row into the text file `out`. Returns the row count."""
+    columns, batches = export_batches(session, name, start, end, batch_size)
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    rows = 0
+    for batch in batches:
+        writer.writerows(batch)
+        rows += len(batch)
+    return rows
+
+
+def _arrow_type(sql_type):
+    if isinstance(sql_type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(sql_type, Date):
+        return pa.date32()
+    if isinstance(sql_type, Boolean):
+        return pa.bool_()
+    if isinstance(sql_type, Integer):
+        return pa.int64()
+    if isinstance(sql_type, Numeric):
+        return pa.decimal128(sql_type.precision or 18, sql_type.scale or 2)
+    return pa.string()
+
+
+def write_parquet(session, name, out, start=None, end=None, batch_size=EXPORT_BATCH_SIZE):
+    """Stream export `name` into the Parquet file `out` (a path or binary file), one row group per batch.
+
+    Returns the row count; raises RuntimeError if pyarrow isn't installed.
+    """
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow).")
+    stmt = EXPORTS[name]()[0]
+    schema = pa.schema([(c.name, _arrow_type(c.type)) for c in stmt.selected_columns])
+    _, batches = export_batches(session, name, start, end, batch_size)
+    rows = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        for batch in batches:
+            writer.write_batch(pa.record_batch(list(zip(*batch)), schema=schema))
+            rows += len(batch)
+    return rows
+
+
+def export_file(session, name, fmt, start=None, end=None):
+    """Write export `name` in `fmt` ('csv' or 'parquet') to a temporary file and return it rewound.
+
+    The file lives on disk, so memory use doesn't grow with the export.
+    """
+    out = tempfile.TemporaryFile()
+    if fmt == "parquet":
+        write_parquet(session, name, out, start, end)
+    else:
+        text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+        write_csv(session, name, text, start, end)
+        text.detach()  # flushes and leaves `out` open
+    out.seek(0)
+    return out
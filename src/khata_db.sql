@@ -501,3 +501,289 @@ INSERT INTO tables (capacity, availability) VALUES
   (2, TRUE),
   (4, TRUE),
   (6, TRUE);
+
+
+-- Indexes for keyset pagination of the order and archive views (newest first)
+CREATE INDEX IF NOT EXISTS ix_orders_order_time ON orders (order_time, order_id);
+CREATE INDEX IF NOT EXISTS ix_archived_orders_archive_time ON archived_orders (archive_time, order_id);
+
+
+-- Sales rollups: revenue and item volume pre-aggregated per hour/day/week (and 'all' for
+-- running totals). Maintained by the app on order insert, rebuilt from orders + archived_orders.
+CREATE TABLE IF NOT EXISTS sales_rollups (
+    period VARCHAR(10) NOT NULL,
+    bucket_start TIMESTAMP NOT NULL,
+    order_count INTEGER DEFAULT 0,
+    item_count INTEGER DEFAULT 0,
+    revenue NUMERIC(12,2) DEFAULT 0,
+    PRIMARY KEY (period, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS item_sales_rollups (
+    period VARCHAR(10) NOT NULL,
+    bucket_start TIMESTAMP NOT NULL,
+    item_id INTEGER NOT NULL,
+    quantity INTEGER DEFAULT 0,
+    revenue NUMERIC(12,2) DEFAULT 0,
+    PRIMARY KEY (period, bucket_start, item_id)
+);
+
+
+-- Snapshot the menu item name and unit price on archived line items so archive
+-- views don't depend on live menu rows
+ALTER TABLE archived_order_items
+    ADD COLUMN IF NOT EXISTS item_name VARCHAR(100),
+    ADD COLUMN IF NOT EXISTS unit_price NUMERIC(10,2);
+
+UPDATE archived_order_items aoi
+SET item_name = mi.name,
+    unit_price = mi.price
+FROM menu_items mi
+WHERE mi.item_id = aoi.menu_item_id
+  AND aoi.item_name IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_archived_order_items_order_id ON archived_order_items (order_id);
+
+CREATE OR REPLACE FUNCTION archive_order_and_items_before_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- Prevent duplicate archiving (bulk archiving inserts the archive rows itself)
+    IF EXISTS (SELECT 1 FROM archived_orders WHERE order_id = OLD.order_id) THEN
+        RETURN OLD;
+    END IF;
+
+    INSERT INTO archived_orders (
+        order_id, user_id, table_id, status,
+        total_amount, payment_status, order_time, archive_time
+    )
+    VALUES (
+        OLD.order_id,
+        OLD.user_id,
+        CASE
+          WHEN EXISTS (SELECT 1 FROM tables WHERE table_id = OLD.table_id)
+            THEN OLD.table_id
+          ELSE NULL
+        END,
+        OLD.status,
+        OLD.total_amount,
+        OLD.payment_status,
+        OLD.order_time,
+        CURRENT_TIMESTAMP
+    );
+
+    -- Archive the order items along with the menu item's current name and price
+    INSERT INTO archived_order_items (order_id, menu_item_id, quantity, total_price, item_name, unit_price)
+    SELECT
+        OLD.order_id,
+        oi.item_id,
+        oi.quantity,
+        oi.total_price,
+        mi.name,
+        mi.price
+    FROM "OrderItems" oi  -- the table models.py creates; unquoted it would fold to orderitems
+    LEFT JOIN menu_items mi ON mi.item_id = oi.item_id
+    WHERE oi.order_id = OLD.order_id;
+
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Rating rollups for the admin feedback view, maintained by the app on feedback insert
+CREATE TABLE IF NOT EXISTS daily_ratings (
+    day DATE PRIMARY KEY,
+    rating_count INTEGER DEFAULT 0,
+    rating_sum INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS item_ratings (
+    item_id INTEGER PRIMARY KEY,
+    rating_count INTEGER DEFAULT 0,
+    rating_sum INTEGER DEFAULT 0
+);
+
+INSERT INTO daily_ratings (day, rating_count, rating_sum)
+SELECT DATE(o.order_time), COUNT(f.rating), SUM(f.rating)
+FROM feedback f
+JOIN orders o ON o.order_id = f.order_id
+WHERE f.rating IS NOT NULL
+GROUP BY DATE(o.order_time)
+ON CONFLICT (day) DO NOTHING;
+
+INSERT INTO item_ratings (item_id, rating_count, rating_sum)
+SELECT oi.item_id, COUNT(f.rating), SUM(f.rating)
+FROM feedback f
+JOIN "OrderItems" oi ON oi.order_id = f.order_id
+WHERE f.rating IS NOT NULL
+GROUP BY oi.item_id
+ON CONFLICT (item_id) DO NOTHING;
+
+
+-- User directory: per-user order counts and case-insensitive prefix search on name/email
+CREATE INDEX IF NOT EXISTS ix_orders_user_id ON orders (user_id);
+CREATE INDEX IF NOT EXISTS ix_users_lower_name ON users (lower(name) varchar_pattern_ops);
+CREATE INDEX IF NOT EXISTS ix_users_lower_email ON users (lower(email) varchar_pattern_ops);
+
+
+-- Time-slotted reservations: each booking holds its table from reservation_time to end_time.
+-- Tables.availability now only means "in service" and is no longer flipped by bookings.
+ALTER TABLE reservations
+    ADD COLUMN IF NOT EXISTS end_time TIMESTAMP,
+    ADD COLUMN IF NOT EXISTS party_size INTEGER;
+
+UPDATE reservations
+SET end_time = reservation_time + INTERVAL '90 minutes'
+WHERE end_time IS NULL;
+
+UPDATE tables SET availability = TRUE;
+
+
+-- Reservation read paths use range predicates on reservation_time
+CREATE INDEX IF NOT EXISTS ix_reservations_time ON reservations (reservation_time);
+CREATE INDEX IF NOT EXISTS ix_reservations_table_time ON reservations (table_id, reservation_time);
+
+
+-- Change tracking for the kitchen display: updated_at moves on every change to an order
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+
+UPDATE orders SET updated_at = order_time WHERE updated_at IS NULL OR updated_at > order_time;
+
+CREATE INDEX IF NOT EXISTS ix_orders_updated_at ON orders (updated_at);
+
+-- Also covers updates made outside the app (e.g. from pgAdmin)
+CREATE OR REPLACE FUNCTION touch_order_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := (CURRENT_TIMESTAMP AT TIME ZONE 'UTC');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS touch_order_updated_at ON orders;
+
+CREATE TRIGGER touch_order_updated_at
+BEFORE UPDATE ON orders
+FOR EACH ROW
+EXECUTE FUNCTION touch_order_updated_at();
+
+
+-- Optimistic concurrency for order updates (SQLAlchemy version counter)
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+
+-- Recipes link menu items to the inventory they consume; placing an order depletes stock
+CREATE TABLE IF NOT EXISTS recipe_items (
+    menu_item_id INTEGER REFERENCES menu_items(item_id) ON DELETE CASCADE,
+    inventory_item_id INTEGER REFERENCES inventory(item_id) ON DELETE CASCADE,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (menu_item_id, inventory_item_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_recipe_items_inventory_item_id ON recipe_items (inventory_item_id);
+
+ALTER TABLE menu_items ADD COLUMN IF NOT EXISTS stock_out BOOLEAN DEFAULT FALSE;
+
+
+-- Inventory alerts scan by expiry date and by stock level
+CREATE INDEX IF NOT EXISTS ix_inventory_expiry_date ON inventory (expiry_date);
+CREATE INDEX IF NOT EXISTS ix_inventory_quantity ON inventory (quantity);
+
+
+-- Stock ledger: every receipt, consumption and waste is appended here, and periodic
+-- snapshots bound how much of the ledger a point-in-time query has to scan
+CREATE TABLE IF NOT EXISTS stock_movements (
+    movement_id SERIAL PRIMARY KEY,
+    inventory_item_id INTEGER NOT NULL REFERENCES inventory(item_id) ON DELETE CASCADE,
+    change INTEGER NOT NULL,
+    reason VARCHAR(20) NOT NULL CHECK (reason IN ('receipt', 'consumption', 'waste')),
+    order_id INTEGER,
+    moved_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_stock_movements_item_time ON stock_movements (inventory_item_id, moved_at);
+
+CREATE TABLE IF NOT EXISTS stock_snapshots (
+    inventory_item_id INTEGER REFERENCES inventory(item_id) ON DELETE CASCADE,
+    taken_at TIMESTAMP NOT NULL,
+    quantity INTEGER NOT NULL,
+    PRIMARY KEY (inventory_item_id, taken_at)
+);
+
+CREATE INDEX IF NOT EXISTS ix_stock_snapshots_taken_at ON stock_snapshots (taken_at);
+
+-- Opening snapshot of the stock on hand before the ledger existed
+INSERT INTO stock_snapshots (inventory_item_id, taken_at, quantity)
+SELECT item_id, (CURRENT_TIMESTAMP AT TIME ZONE 'UTC'), quantity
+FROM inventory
+ON CONFLICT DO NOTHING;
+
+
+-- Line items are always fetched, archived and deleted by order; without this
+-- every order page scanned the whole "OrderItems" table
+CREATE INDEX IF NOT EXISTS "ix_OrderItems_order_id" ON "OrderItems" (order_id);
+
+
+-- Date-range exports of the archive filter on when the order was placed
+CREATE INDEX IF NOT EXISTS ix_archived_orders_order_time ON archived_orders (order_time);
+
+
+-- Menu price history: one row per price an item has had, written by the add,
+-- bulk import and bulk reprice paths in catalogue.py
+CREATE TABLE IF NOT EXISTS menu_price_history (
+    change_id SERIAL PRIMARY KEY,
+    item_id INTEGER NOT NULL,
+    old_price NUMERIC(10, 2),
+    new_price NUMERIC(10, 2) NOT NULL,
+    source VARCHAR(20) NOT NULL,
+    changed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_menu_price_history_item_time ON menu_price_history (item_id, changed_at);
+
+-- Current prices as the starting point of the history
+INSERT INTO menu_price_history (item_id, old_price, new_price, source, changed_at)
+SELECT item_id, NULL, price, 'add', (CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+FROM menu_items
+WHERE price IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM menu_price_history h WHERE h.item_id = menu_items.item_id);
+
+
+-- Orders only append their sales deltas here; reports.fold_pending_sales() adds them into
+-- the rollups when the dashboard loads, so concurrent orders never wait on (or deadlock over)
+-- the same rollup rows
+CREATE TABLE IF NOT EXISTS pending_sales (
+    pending_id SERIAL PRIMARY KEY,
+    order_time TIMESTAMP NOT NULL,
+    order_count INTEGER DEFAULT 0,
+    item_id INTEGER,
+    quantity INTEGER DEFAULT 0,
+    revenue NUMERIC(12,2) DEFAULT 0
+);
+
+
+-- Point-in-time stock scans the ledger by time alone, between a snapshot and the
+-- requested moment; the (inventory_item_id, moved_at) index can't serve that range
+CREATE INDEX IF NOT EXISTS ix_stock_movements_moved_at ON stock_movements (moved_at);
+
+
+-- Feedback and payments move to the archive with their order (orders.archive_orders()),
+-- before the order row is deleted; they keep their original ids
+CREATE TABLE IF NOT EXISTS archived_feedback (
+    feedback_id INTEGER PRIMARY KEY,
+    user_id INTEGER REFERENCES users(user_id) ON DELETE SET NULL,
+    order_id INTEGER,
+    rating INTEGER,
+    comments TEXT
+);
+
+CREATE INDEX IF NOT EXISTS ix_archived_feedback_order_id ON archived_feedback (order_id);
+
+CREATE TABLE IF NOT EXISTS archived_payments (
+    payment_id INTEGER PRIMARY KEY,
+    order_id INTEGER,
+    payment_type VARCHAR(50),
+    amount NUMERIC(10,2),
+    status VARCHAR(50)
+);
+
+CREATE INDEX IF NOT EXISTS ix_archived_payments_order_id ON archived_payments (order_id);
@@ -1,5 +1,5 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, String, Numeric, Boolean, Text, ForeignKey, Date, DateTime
+from sqlalchemy import Column, Integer, String, Numeric, Boolean, Text, ForeignKey, Date, DateTime, Index, func
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -18,23 +18,37 @@ class User(Base):
     orders = relationship("Order", back_populates="user", cascade="all, delete-orphan")
     feedbacks = relationship("Feedback", back_populates="user", cascade="all, delete-orphan")
 
+    # Case-insensitive prefix search in the user directory (accounts.user_page())
+    __table_args__ = (
+        Index("ix_users_lower_name", func.lower(name)),
+        Index("ix_users_lower_email", func.lower(email)),
+    )
+
 
 class Order(Base):
     __tablename__ = 'orders'
 
     order_id = Column(Integer, primary_key=True)
-    user_id = Column(Integer, ForeignKey('users.user_id'))
+    user_id = Column(Integer, ForeignKey('users.user_id'), index=True)
     table_id = Column(Integer, ForeignKey('tables.table_id'))
     status = Column(String(50), default="Pending")
     total_amount = Column(Numeric(10, 2))
     payment_status = Column(String(50), default="Unpaid")
     order_time = Column(DateTime, default=datetime.utcnow)
+    # Bumped on every change; the kitchen display polls for rows past its high-water mark
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # Optimistic locking: ORM updates of a stale Order raise StaleDataError
+    version = Column(Integer, nullable=False, default=1)
 
     # Relationships
     user = relationship("User", back_populates="orders")
     order_items = relationship("OrderItems", back_populates="order", cascade="all, delete-orphan")
     feedbacks = relationship("Feedback", back_populates="order", cascade="all, delete-orphan")
 
+    # Backs the keyset pagination in orders.order_page()
+    __table_args__ = (Index("ix_orders_order_time", "order_time", "order_id"),)
+    __mapper_args__ = {"version_id_col": version}
+
 
 class Feedback(Base):
     __tablename__ = 'feedback'
@@ -54,7 +68,7 @@ class Table(Base):
     __tablename__ = 'tables'
     table_id = Column(Integer, primary_key=True)
     capacity = Column(Integer)
-    availability = Column(Boolean, default=True)
+    availability = Column(Boolean, default=True)  # in service; bookings are tracked per time slot in reservations
 
 class Reservation(Base):
     __tablename__ = 'reservations'
@@ -62,8 +76,16 @@ class Reservation(Base):
     user_id = Column(Integer, ForeignKey('users.user_id'))
     table_id = Column(Integer, ForeignKey('tables.table_id'))
     reservation_time = Column(DateTime)
+    end_time = Column(DateTime)  # reservation_time + booked duration
+    party_size = Column(Integer)
     status = Column(String(50), default="Confirmed")
 
+    # Range scans by time (day/upcoming views) and per-table overlap checks
+    __table_args__ = (
+        Index("ix_reservations_time", "reservation_time"),
+        Index("ix_reservations_table_time", "table_id", "reservation_time"),
+    )
+
 class Payment(Base):
     __tablename__ = 'payments'
     payment_id = Column(Integer, primary_key=True)
@@ -76,8 +98,8 @@ class Inventory(Base):
     __tablename__ = 'inventory'
     item_id = Column(Integer, primary_key=True)
     name = Column(String(100))
-    quantity = Column(Integer)
-    expiry_date = Column(Date)
+    quantity = Column(Integer, index=True)  # low-stock scans: quantity < threshold
+    expiry_date = Column(Date, index=True)  # expiry scans: expiry_date <= cutoff
     supplier_id = Column(Integer)
 
 
@@ -90,16 +112,31 @@ class MenuItem(Base):
     price = Column(Numeric(10, 2))
     availability = Column(Boolean, default=True)
     ingredients = Column(Text)
+    # Set when stock.deplete_stock() switched the item off, so a restock can switch it back on
+    stock_out = Column(Boolean, default=False)
 
     # Relationship to OrderItems
     order_items = relationship("OrderItems", back_populates="menu_item", cascade="all, delete-orphan")
+    recipe = relationship("RecipeItem", back_populates="menu_item", cascade="all, delete-orphan")
+
+
+class RecipeItem(Base):
+    """Inventory needed for one portion of a menu item."""
+    __tablename__ = 'recipe_items'
+
+    menu_item_id = Column(Integer, ForeignKey('menu_items.item_id', ondelete='CASCADE'), primary_key=True)
+    inventory_item_id = Column(Integer, ForeignKey('inventory.item_id', ondelete='CASCADE'), primary_key=True, index=True)
+    quantity = Column(Integer, nullable=False)
+
+    menu_item = relationship("MenuItem", back_populates="recipe")
+    inventory_item = relationship("Inventory")
 
 
 class OrderItems(Base):
     __tablename__ = 'OrderItems'
 
     order_item_id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey('orders.order_id'))
+    order_id = Column(Integer, ForeignKey('orders.order_id'), index=True)
     item_id = Column(Integer, ForeignKey('menu_items.item_id'))
     quantity = Column(Integer)
     total_price = Column(Numeric(10, 2))  # Ensure this is here
@@ -121,6 +158,14 @@ class ArchivedOrder(Base):
 
     user = relationship("User", backref="archived_orders", foreign_keys=[user_id])
     table = relationship("Table", backref="archived_orders", foreign_keys=[table_id])
+    # archived_order_items has no FK to archived_orders, so the join is spelled out
+    items = relationship("ArchivedOrderItems", viewonly=True, order_by="ArchivedOrderItems.item_id",
+                         primaryjoin="ArchivedOrder.order_id == foreign(ArchivedOrderItems.order_id)")
+
+    __table_args__ = (
+        Index("ix_archived_orders_archive_time", "archive_time", "order_id"),
+        Index("ix_archived_orders_order_time", "order_time"),  # date-range exports (exports.py)
+    )
 
     def _repr_(self):
         return f"<ArchivedOrder(order_id={self.order_id}, user_id={self.user_id}, status={self.status})>"
@@ -130,14 +175,141 @@ class ArchivedOrderItems(Base):
     __tablename__ = 'archived_order_items'
 
     item_id = Column(Integer, primary_key=True)
-    order_id = Column(Integer)
+    order_id = Column(Integer, index=True)
     menu_item_id = Column(Integer)
     quantity = Column(Integer)
     total_price = Column(Numeric(10, 2))
+    # Snapshot of the menu item at archive time, so history survives menu edits and deletes
+    item_name = Column(String(100))
+    unit_price = Column(Numeric(10, 2))
+
+    # Live menu row, if it still exists (no FK: menu items may be deleted after archiving)
+    menu_item = relationship("MenuItem", viewonly=True,
+                             primaryjoin="foreign(ArchivedOrderItems.menu_item_id) == MenuItem.item_id")
 
     def _repr_(self):
         return f"<ArchivedOrderItems(order_id={self.order_id}, menu_item_id={self.menu_item_id}, quantity={self.quantity})>"
 
 
+class ArchivedFeedback(Base):
+    """Feedback on an archived order, moved over by orders.archive_orders() with its original feedback_id."""
+    __tablename__ = 'archived_feedback'
+
+    feedback_id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.user_id', ondelete='SET NULL'), nullable=True)
+    order_id = Column(Integer, index=True)
+    rating = Column(Integer)
+    comments = Column(Text)
+
+    # Same attribute names as Feedback, so the feedback feed can show either
+    user = relationship("User", viewonly=True)
+    order = relationship("ArchivedOrder", viewonly=True,
+                         primaryjoin="foreign(ArchivedFeedback.order_id) == ArchivedOrder.order_id")
+
+
+class ArchivedPayment(Base):
+    __tablename__ = 'archived_payments'
+
+    payment_id = Column(Integer, primary_key=True)
+    order_id = Column(Integer, index=True)
+    payment_type = Column(String(50))
+    amount = Column(Numeric(10, 2))
+    status = Column(String(50))
+
+
+class SalesRollup(Base):
+    """Pre-aggregated revenue per time bucket, maintained by reports.fold_pending_sales()."""
+    __tablename__ = 'sales_rollups'
+
+    period = Column(String(10), primary_key=True)  # 'hour', 'day', 'week' or 'all'
+    bucket_start = Column(DateTime, primary_key=True)
+    order_count = Column(Integer, default=0)
+    item_count = Column(Integer, default=0)
+    revenue = Column(Numeric(12, 2), default=0)
+
+
+class ItemSalesRollup(Base):
+    """Pre-aggregated item volume and revenue per time bucket."""
+    __tablename__ = 'item_sales_rollups'
+
+    period = Column(String(10), primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    item_id = Column(Integer, primary_key=True)
+    quantity = Column(Integer, default=0)
+    revenue = Column(Numeric(12, 2), default=0)
+
+
+class PendingSale(Base):
+    """Sales deltas queued by reports.record_order_sales() until fold_pending_sales() adds them to the rollups."""
+    __tablename__ = 'pending_sales'
+
+    pending_id = Column(Integer, primary_key=True)
+    order_time = Column(DateTime, nullable=False)
+    order_count = Column(Integer, default=0)  # +1/-1 on the order's own row, 0 on its line rows
+    item_id = Column(Integer)  # set on line rows
+    quantity = Column(Integer, default=0)
+    revenue = Column(Numeric(12, 2), default=0)
+
+
+
+class DailyRating(Base):
+    """Feedback ratings summed per day the rated order was placed (see reports.record_feedback())."""
+    __tablename__ = 'daily_ratings'
+
+    day = Column(Date, primary_key=True)
+    rating_count = Column(Integer, default=0)
+    rating_sum = Column(Integer, default=0)
+
+
+class ItemRating(Base):
+    """Feedback ratings summed per menu item in the rated order."""
+    __tablename__ = 'item_ratings'
+
+    item_id = Column(Integer, primary_key=True)
+    rating_count = Column(Integer, default=0)
+    rating_sum = Column(Integer, default=0)
+
+
+
+class StockMovement(Base):
+    """Append-only ledger of every change to Inventory.quantity."""
+    __tablename__ = 'stock_movements'
+
+    movement_id = Column(Integer, primary_key=True)
+    inventory_item_id = Column(Integer, ForeignKey('inventory.item_id', ondelete='CASCADE'), nullable=False)
+    change = Column(Integer, nullable=False)  # positive for receipts, negative for consumption/waste
+    reason = Column(String(20), nullable=False)  # 'receipt', 'consumption' or 'waste'
+    order_id = Column(Integer)  # set for consumption; no FK so the ledger survives archiving
+    moved_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_stock_movements_item_time", "inventory_item_id", "moved_at"),
+        Index("ix_stock_movements_moved_at", "moved_at"),  # point-in-time scans (stock.stock_at())
+    )
+
+
+class StockSnapshot(Base):
+    """Inventory.quantity as of taken_at; point-in-time stock starts from the latest one."""
+    __tablename__ = 'stock_snapshots'
+
+    inventory_item_id = Column(Integer, ForeignKey('inventory.item_id', ondelete='CASCADE'), primary_key=True)
+    taken_at = Column(DateTime, primary_key=True, index=True)
+    quantity = Column(Integer, nullable=False)
+
+
+class MenuPriceChange(Base):
+    """Every price a menu item has had, so old OrderItems.total_price values can be explained."""
+    __tablename__ = 'menu_price_history'
+
+    change_id = Column(Integer, primary_key=True)
+    item_id = Column(Integer, nullable=False)  # no FK: history outlives deleted menu items
+    old_price = Column(Numeric(10, 2))  # NULL when the item was added
+    new_price = Column(Numeric(10, 2), nullable=False)
+    source = Column(String(20), nullable=False)  # 'add', 'import' or 'reprice'
+    changed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (Index("ix_menu_price_history_item_time", "item_id", "changed_at"),)
+
+
 # Adding back_populates to the Order model to establish the relationship
 Order.order_items = relationship('OrderItems', back_populates='order')
\ No newline at end of file
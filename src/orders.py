@@ -0,0 +1,349 @@
+from datetime import datetime, time, timedelta
+from sqlalchemy import and_, or_, insert, delete, select, literal, update
+from sqlalchemy.orm import joinedload, selectinload
+from models import Order, OrderItems, ArchivedOrder, ArchivedOrderItems, MenuItem, Table, Feedback, Payment, \
+    ArchivedFeedback, ArchivedPayment
+from reports import record_order_sales, rebuild_sales_rollups, rebuild_rating_rollups, forget_archived_feedback
+from stock import deplete_stock
+from catalogue import bump_menu_version
+
+
+def _board_query(session):
+    # Users are joined in the main query and line items + menu items come in one
+    # extra SELECT ... IN, so a page costs two statements however many items it shows
+    return session.query(Order).options(
+        joinedload(Order.user),
+        selectinload(Order.order_items).joinedload(OrderItems.menu_item),
+    )
+
+
+def keyset_page(query, time_col, id_col, page_size, after=None, start=None, end=None):
+    """Return (rows, next_cursor) for one page ordered newest first.
+
+    `after` is the (time, id) cursor of the last row of the previous page and
+    `start`/`end` are inclusive dates. `next_cursor` is None on the last page.
+    """
+    if start is not None:
+        query = query.filter(time_col >= datetime.combine(start, time.min))
+    if end is not None:
+        query = query.filter(time_col < datetime.combine(end + timedelta(days=1), time.min))
+    if after is not None:
+        after_time, after_id = after
+        query = query.filter(or_(time_col < after_time, and_(time_col == after_time, id_col < after_id)))
+
+    # Fetch one extra row to find out whether there is a next page
+    rows = query.order_by(time_col.desc(), id_col.desc()).limit(page_size + 1).all()
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, (getattr(last, time_col.key), getattr(last, id_col.key))
+
+
+def order_page(session, page_size, after=None, start=None, end=None, user_id=None):
+    """One page of orders with customer, line items and menu items already loaded."""
+    query = _board_query(session)
+    if user_id is not None:
+        query = query.filter(Order.user_id == user_id)
+    return keyset_page(query, Order.order_time, Order.order_id, page_size, after, start, end)
+
+
+def archived_order_page(session, page_size, after=None, start=None, end=None):
+    """One page of archived orders, newest archive first, with users, items and item names loaded.
+
+    Line items (and the live menu rows for any without a snapshotted name) come
+    in a single extra SELECT ... IN for the whole page.
+    """
+    query = session.query(ArchivedOrder).options(
+        joinedload(ArchivedOrder.user),
+        selectinload(ArchivedOrder.items).joinedload(ArchivedOrderItems.menu_item),
+    )
+    return keyset_page(query, ArchivedOrder.archive_time, ArchivedOrder.order_id, page_size, after, start, end)
+
+
+def create_order(session, user_id, table_id, quantities):
+    """Create an order and its line items in a single transaction.
+
+    `quantities` maps menu item_id -> quantity. Prices are read from the menu in
+    one IN query and the total is computed from them, so it never depends on
+    what the page displayed. Items that are no longer available are skipped.
+    Ingredient stock is depleted and the sales rollups are updated in the same
+    transaction; if stock runs short the whole order is rolled back.
+    Returns (order, lines) where each line is a dict of the inserted OrderItems
+    values; raises ValueError if nothing orderable was selected.
+    """
+    quantities = {item_id: qty for item_id, qty in quantities.items() if qty > 0}
+    prices = dict(
+        session.query(MenuItem.item_id, MenuItem.price)
+        .filter(MenuItem.item_id.in_(list(quantities)), MenuItem.availability == True)
+        .all()
+    )
+    lines = [
+        {"item_id": item_id, "quantity": qty, "total_price": prices[item_id] * qty}
+        for item_id, qty in quantities.items() if item_id in prices
+    ]
+    if not lines:
+        raise ValueError("None of the selected items are available.")
+
+    try:
+        order = Order(
+            user_id=user_id,
+            table_id=table_id,
+            order_time=datetime.utcnow(),
+            total_amount=sum(line["total_price"] for line in lines),
+            status="Pending",
+            payment_status="Unpaid"
+        )
+        session.add(order)
+        session.flush()  # assigns order.order_id without committing
+
+        for line in lines:
+            line["order_id"] = order.order_id
+        session.execute(insert(OrderItems), lines)
+        menu_changed = deplete_stock(session, {line["item_id"]: line["quantity"] for line in lines},
+                                     order_id=order.order_id)
+        record_order_sales(session, order.order_time, order.total_amount,
+                           [(line["item_id"], line["quantity"], line["total_price"]) for line in lines])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    if menu_changed:
+        bump_menu_version()
+    return order, lines
+
+
+def customer_orders(session, user_id):
+    """All of one customer's orders, newest first."""
+    return session.query(Order).filter(Order.user_id == user_id).order_by(Order.order_time.desc()).all()
+
+
+def clear_orders(session):
+    """Delete every current order with its line items, feedback and payments and rebuild the rollups; commits."""
+    try:
+        session.execute(delete(OrderItems))
+        session.execute(delete(Feedback).where(Feedback.order_id.isnot(None)))
+        session.execute(delete(Payment).where(Payment.order_id.isnot(None)))
+        session.execute(delete(Order))
+        rebuild_sales_rollups(session)
+        rebuild_rating_rollups(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def archive_orders(session, order_ids):
+    """Move the given orders, their line items, feedback and payments into the archive tables in one transaction.
+
+    Works in set-based INSERT ... SELECT / DELETE statements over batches of ids
+    instead of row by row; the rows referencing an order are moved before the
+    order itself, so foreign keys hold throughout. Line items keep a snapshot
+    of the menu item's name and price. The archived copy gets status 'Archived' and a NULL
+    table_id if the table no longer exists, like the archive trigger in
+    khata_db.sql (which skips orders that are already archived). Sales rollups
+    are unaffected since archived orders still count as sales. Returns the
+    number of orders archived.
+    """
+    order_ids = list(order_ids)
+    archive_time = datetime.utcnow()
+    archived = 0
+    try:
+        for i in range(0, len(order_ids), ARCHIVE_BATCH_SIZE):
+            batch = order_ids[i:i + ARCHIVE_BATCH_SIZE]
+
+            session.execute(
+                insert(ArchivedOrderItems).from_select(
+                    ["order_id", "menu_item_id", "quantity", "total_price", "item_name", "unit_price"],
+                    select(OrderItems.order_id, OrderItems.item_id, OrderItems.quantity, OrderItems.total_price,
+                           MenuItem.name, MenuItem.price)
+                    .outerjoin(MenuItem, MenuItem.item_id == OrderItems.item_id)
+                    .where(OrderItems.order_id.in_(batch)),
+                )
+            )
+            session.execute(
+                insert(ArchivedOrder).from_select(
+                    ["order_id", "user_id", "table_id", "status", "total_amount",
+                     "payment_status", "order_time", "archive_time"],
+                    select(Order.order_id, Order.user_id, Table.table_id, literal("Archived"), Order.total_amount,
+                           Order.payment_status, Order.order_time, literal(archive_time))
+                    .outerjoin(Table, Table.table_id == Order.table_id)
+                    .where(Order.order_id.in_(batch)),
+                )
+            )
+            session.execute(
+                insert(ArchivedFeedback).from_select(
+                    ["feedback_id", "user_id", "order_id", "rating", "comments"],
+                    select(Feedback.feedback_id, Feedback.user_id, Feedback.order_id, Feedback.rating,
+                           Feedback.comments)
+                    .where(Feedback.order_id.in_(batch)),
+                )
+            )
+            session.execute(
+                insert(ArchivedPayment).from_select(
+                    ["payment_id", "order_id", "payment_type", "amount", "status"],
+                    select(Payment.payment_id, Payment.order_id, Payment.payment_type, Payment.amount,
+                           Payment.status)
+                    .where(Payment.order_id.in_(batch)),
+                )
+            )
+            session.execute(delete(OrderItems).where(OrderItems.order_id.in_(batch)))
+            session.execute(delete(Feedback).where(Feedback.order_id.in_(batch)))
+            session.execute(delete(Payment).where(Payment.order_id.in_(batch)))
+            archived += session.execute(delete(Order).where(Order.order_id.in_(batch))).rowcount
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return archived
+
+
+def delete_archived_order(session, archived):
+    """Permanently delete an ArchivedOrder with its items, feedback and payments,
+    taking it back out of the sales and rating rollups; commits."""
+    try:
+        record_order_sales(session, archived.order_time, archived.total_amount,
+                           [(i.menu_item_id, i.quantity, i.total_price) for i in archived.items], sign=-1)
+        session.execute(delete(ArchivedOrderItems).where(ArchivedOrderItems.order_id == archived.order_id))
+        forget_archived_feedback(session, archived)
+        session.execute(delete(ArchivedPayment).where(ArchivedPayment.order_id == archived.order_id))
+        session.execute(delete(ArchivedOrder).where(ArchivedOrder.order_id == archived.order_id))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+
+def archive_completed_orders(session, older_than):
+    """Archive every Completed order placed before `older_than` (a datetime) in one transaction."""
+    # Lock the selected orders so none change status while they are being moved
+    order_ids = session.scalars(
+        select(Order.order_id)
+        .where(Order.status == "Completed", Order.order_time < older_than)
+        .with_for_update()
+    ).all()
+    return archive_orders(session, order_ids)
+
+
+OPEN_STATUSES = ("Pending", "In Progress")
+
+
+def open_orders(session):
+    """Orders still moving through the kitchen, oldest first."""
+    return session.query(Order).filter(Order.status.in_(OPEN_STATUSES)).order_by(Order.order_time).all()
+
+
+def _kitchen_ticket(order):
+    # Plain data, so the board can outlive the session that loaded it
+    return {
+        "order_id": order.order_id,
+        "table_id": order.table_id,
+        "status": order.status,
+        "order_time": order.order_time,
+        "customer": order.user.name if order.user else "Unknown",
+        "items": [(i.menu_item.name if i.menu_item else "Unknown Item", i.quantity) for i in order.order_items],
+    }
+
+
+class KitchenBoard:
+    """In-memory board of open orders kept current by polling only for changed rows.
+
+    Each refresh asks for orders whose updated_at is at or past the high-water
+    mark (minus a small grace period for transactions that committed late) and
+    applies them as deltas, so a poll costs O(changes) rather than O(open
+    orders). Orders removed outright (e.g. archived) aren't seen by delta
+    polls, so the board is fully reloaded every `resync_every`.
+    """
+
+    def __init__(self, grace=timedelta(seconds=5), resync_every=timedelta(minutes=5)):
+        self.grace = grace
+        self.resync_every = resync_every
+        self.tickets = {}
+        self.high_water = None
+        self.last_resync = None
+
+    def _load(self, query):
+        return query.options(
+            joinedload(Order.user),
+            selectinload(Order.order_items).joinedload(OrderItems.menu_item),
+        ).all()
+
+    def refresh(self, session):
+        """Bring the board up to date; returns the number of orders applied."""
+        now = datetime.utcnow()
+        if self.high_water is None or now - self.last_resync >= self.resync_every:
+            orders = self._load(session.query(Order).filter(Order.status.in_(OPEN_STATUSES)))
+            self.tickets = {o.order_id: _kitchen_ticket(o) for o in orders}
+            self.last_resync = now
+        else:
+            orders = self._load(session.query(Order).filter(Order.updated_at >= self.high_water - self.grace))
+            for o in orders:
+                if o.status in OPEN_STATUSES:
+                    self.tickets[o.order_id] = _kitchen_ticket(o)
+                else:
+                    self.tickets.pop(o.order_id, None)
+
+        # Never move the mark past the database's newest change, nor backwards
+        newest = max((o.updated_at for o in orders if o.updated_at), default=None)
+        if self.high_water is None:
+            self.high_water = newest or now
+        elif newest and newest > self.high_water:
+            self.high_water = newest
+        return len(orders)
+
+    def by_status(self, status):
+        return sorted((t for t in self.tickets.values() if t["status"] == status), key=lambda t: t["order_time"])
+
+
+# Pending -> In Progress -> Completed; maps each target status to the statuses it may come from
+ALLOWED_FROM = {
+    "In Progress": ("Pending",),
+    "Completed": ("In Progress",),
+}
+
+
+def next_statuses(status):
+    return [target for target, sources in ALLOWED_FROM.items() if status in sources]
+
+
+def transition_order_status(session, order_id, new_status, expected_version=None):
+    """Move an order to `new_status` with one UPDATE ... WHERE status IN (allowed) and commit.
+
+    With `expected_version` the update also requires the version the caller
+    last saw, so a change made in the meantime by someone else is detected
+    instead of overwritten. Raises ValueError describing the conflict when no
+    row was updated.
+    """
+    allowed_from = ALLOWED_FROM.get(new_status)
+    if not allowed_from:
+        raise ValueError(f"Orders can't be moved to {new_status}.")
+
+    stmt = (
+        update(Order)
+        .where(Order.order_id == order_id, Order.status.in_(allowed_from))
+        .values(status=new_status, version=Order.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if expected_version is not None:
+        stmt = stmt.where(Order.version == expected_version)
+    try:
+        updated = session.execute(stmt).rowcount
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    if updated:
+        return
+
+    # Nothing matched: find out why, for the message
+    current = session.execute(
+        select(Order.status, Order.version).where(Order.order_id == order_id)
+    ).first()
+    if current is None:
+        raise ValueError(f"Order #{order_id} no longer exists.")
+    if expected_version is not None and current.version != expected_version:
+        raise ValueError(f"Order #{order_id} was changed by someone else and is now {current.status}.")
+    raise ValueError(f"Order #{order_id} is {current.status} and can't move to {new_status}.")
@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from sqlalchemy import event
+
+# Statements slower than this are logged on their own, wherever they run
+SLOW_QUERY_MS = float(os.environ.get("KHATA_SLOW_QUERY_MS", "200"))
+# The same statement shape this many times in one run is flagged as a likely N+1
+N_PLUS_ONE_MIN = int(os.environ.get("KHATA_N_PLUS_ONE_MIN", "5"))
+# Optional file that receives one JSON line per page run and per slow statement
+PERF_LOG = os.environ.get("KHATA_PERF_LOG")
+
+SLOWEST_KEPT = 5
+RECENT_RUNS = 200
+
+log = logging.getLogger("khata.perf")
+if PERF_LOG:
+    _handler = logging.FileHandler(PERF_LOG)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+
+_lock = threading.Lock()
+_scopefunc = threading.get_ident
+_active = {}   # scope -> PageRun being recorded
+_pages = {}    # page -> PageStats
+_recent = deque(maxlen=RECENT_RUNS)
+
+# Placeholder lists such as IN (?, ?, ?) and inline literals don't change a statement's shape
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)"
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+def statement_shape(sql):
+    """`sql` with literals and placeholder lists collapsed, so repeats of one query compare equal."""
+    sql = _PLACEHOLDER_LIST.sub("(?)", sql)
+    sql = _LITERAL.sub("?", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class PageRun:
+    """Statements issued during one script run of one page."""
+
+    def __init__(self, page):
+        self.page = page
+        self.started = time.perf_counter()
+        self.statements = 0
+        self.db_time = 0.0
+        self.slowest = []  # (seconds, shape), slowest first
+        self.shapes = Counter()
+
+    def record(self, sql, elapsed):
+        shape = statement_shape(sql)
+        self.statements += 1
+        self.db_time += elapsed
+        self.shapes[shape] += 1
+        if len(self.slowest) < SLOWEST_KEPT or elapsed > self.slowest[-1][0]:
+            self.slowest = sorted(self.slowest + [(elapsed, shape)], reverse=True)[:SLOWEST_KEPT]
+
+    def n_plus_one(self):
+        """[(shape, count)] for statement shapes repeated at least N_PLUS_ONE_MIN times."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= N_PLUS_ONE_MIN]
+
+
+class PageStats:
+    """Totals for every recorded run of one page."""
+
+    def __init__(self, page):
+        self.page = page
+        self.runs = 0
+        self.statements = 0
+        self.db_time = 0.0
+        self.worst_db_time = 0.0
+        self.slowest = []
+        self.n_plus_one = Counter()  # shape -> runs in which it was flagged
+
+    def add(self, run, flagged):
+        self.runs += 1
+        self.statements += run.statements
+        self.db_time += run.db_time
+        self.worst_db_time = max(self.worst_db_time, run.db_time)
+        self.slowest = sorted(self.slowest + run.slowest, reverse=True)[:SLOWEST_KEPT]
+        self.n_plus_one.update(shape for shape, _ in flagged)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("perf_started", []).append((context, time.perf_counter()))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["perf_started"].pop()[1]
+    run = _active.get(_scopefunc())
+    if run is not None:
+        run.record(statement, elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        log.warning(json.dumps({
+            "event": "slow_query", "page": run.page if run else None,
+            "ms": round(elapsed * 1000, 1), "sql": statement_shape(statement)[:1000],
+        }))
+
+
+def _handle_error(context):
+    # after_cursor_execute never fires for a failed statement, so drop its start time here
+    # (if it got as far as before_cursor_execute)
+    started = context.connection.info.get("perf_started") if context.connection is not None else None
+    if started and started[-1][0] is context.execution_context:
+        started.pop()
+
+
+def instrument(engine, scopefunc=threading.get_ident):
+    """Time every statement `engine` runs and attribute it to the page run of the current scope.
+
+    `scopefunc` must match the one the scoped session uses, so a run started
+    by begin_run() sees the statements of that script run.
+    """
+    global _scopefunc
+    _scopefunc = scopefunc
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+def begin_run(page):
+    """Start recording statements for this scope under `page`.
+
+    A run left open by st.rerun() or st.stop() is finished first.
+    """
+    end_run()
+    _active[_scopefunc()] = PageRun(page)
+
+
+def name_run(page):
+    """Attribute the current run to `page`, once the page is known."""
+    run = _active.get(_scopefunc())
+    if run is not None:
+        run.page = page
+
+
+def end_run():
+    """Finish the current run, fold it into the per-page stats and log it as one JSON line."""
+    run = _active.pop(_scopefunc(), None)
+    if run is None:
+        return None
+    flagged = run.n_plus_one()
+    with _lock:
+        _pages.setdefault(run.page, PageStats(run.page)).add(run, flagged)
+        _recent.append(run)
+    log.info(json.dumps({
+        "event": "page_run", "page": run.page, "statements": run.statements,
+        "db_ms": round(run.db_time * 1000, 1),
+        "wall_ms": round((time.perf_counter() - run.started) * 1000, 1),
+        "slowest_ms": round(run.slowest[0][0] * 1000, 1) if run.slowest else 0,
+        "n_plus_one": [{"sql": shape[:300], "count": n} for shape, n in flagged],
+    }))
+    return run
+
+
+@contextmanager
+def track(page):
+    """Record the block as its own run of `page`, unless a run is already being recorded.
+
+    For fragments, which rerun on their own without the rest of the script.
+    """
+    if _scopefunc() in _active:
+        yield
+        return
+    begin_run(page)
+    try:
+        yield
+    finally:
+        end_run()
+
+
+def page_stats():
+    """PageStats for every page seen in this process, most DB time first."""
+    with _lock:
+        return sorted(_pages.values(), key=lambda p: p.db_time, reverse=True)
+
+
+def recent_runs(limit=50):
+    """The latest finished runs, newest first."""
+    with _lock:
+        return list(_recent)[::-1][:limit]
+
+
+def reset_stats():
+    with _lock:
+        _pages.clear()
+        _recent.clear()
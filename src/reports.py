@@ -0,0 +1,352 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select, func, union, union_all
+from sqlalchemy.orm import joinedload
+from models import Order, OrderItems, ArchivedOrder, ArchivedOrderItems, MenuItem, SalesRollup, ItemSalesRollup, \
+    PendingSale, Feedback, ArchivedFeedback, DailyRating, ItemRating
+
+PERIODS = ("hour", "day", "week", "all")
+ALL_TIME = datetime(1970, 1, 1)  # the single bucket of the 'all' period, i.e. running totals
+
+
+def bucket_start(period, moment):
+    """Start of the `period` bucket containing `moment` (weeks start on Monday)."""
+    if period == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if period == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "week":
+        day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        return day - timedelta(days=day.weekday())
+    return ALL_TIME
+
+
+def _dialect_insert(session):
+    # Both backends we run on support INSERT ... ON CONFLICT DO UPDATE
+    if session.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def _upsert_add(session, model, keys, rows):
+    """Insert `rows` into `model`'s table, adding the non-key columns onto any existing row.
+
+    Rows are written in primary key order, so two transactions upserting
+    overlapping rows lock them in the same order and can't deadlock.
+    """
+    if not rows:
+        return
+    rows = sorted(rows, key=lambda row: [(row[k] is None, row[k]) for k in keys])
+    insert = _dialect_insert(session)
+    table = model.__table__
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={col: table.c[col] + stmt.excluded[col] for col in rows[0] if col not in keys},
+    )
+    session.execute(stmt, rows)
+
+
+def _apply(session, order_totals, item_totals):
+    """Add aggregated deltas to the rollup tables with one upsert per table."""
+    _upsert_add(session, SalesRollup, ["period", "bucket_start"], [
+        {"period": period, "bucket_start": bucket, "order_count": count, "item_count": items, "revenue": revenue}
+        for (period, bucket), (count, items, revenue) in order_totals.items()
+    ])
+    _upsert_add(session, ItemSalesRollup, ["period", "bucket_start", "item_id"], [
+        {"period": period, "bucket_start": bucket, "item_id": item_id, "quantity": qty, "revenue": revenue}
+        for (period, bucket, item_id), (qty, revenue) in item_totals.items()
+    ])
+
+
+def _accumulate(order_totals, item_totals, order_time, total_amount, lines, sign):
+    items = sum(qty or 0 for _, qty, _ in lines)
+    for period in PERIODS:
+        bucket = bucket_start(period, order_time)
+        totals = order_totals[(period, bucket)]
+        totals[0] += sign
+        totals[1] += sign * items
+        totals[2] += sign * (total_amount or 0)
+        for item_id, qty, price in lines:
+            item = item_totals[(period, bucket, item_id)]
+            item[0] += sign * (qty or 0)
+            item[1] += sign * (price or 0)
+
+
+def record_order_sales(session, order_time, total_amount, lines, sign=1):
+    """Queue one order's sales for the rollups (or their removal with sign=-1) without committing.
+
+    `lines` is an iterable of (item_id, quantity, total_price). Call this inside
+    the transaction that creates or permanently deletes the order. It only
+    appends to pending_sales, so orders placed at the same time never wait on
+    each other's rollup rows; fold_pending_sales() adds the queue in later.
+    """
+    lines = list(lines)
+    session.execute(insert(PendingSale), [
+        {"order_time": order_time, "order_count": sign, "item_id": None,
+         "quantity": sign * sum(qty or 0 for _, qty, _ in lines), "revenue": sign * (total_amount or 0)},
+    ] + [
+        {"order_time": order_time, "order_count": 0, "item_id": item_id,
+         "quantity": sign * (qty or 0), "revenue": sign * (price or 0)}
+        for item_id, qty, price in lines
+    ])
+
+
+def fold_pending_sales(session, batch_size=5000):
+    """Add the queued sales deltas into the rollups and commit; returns the number of queue rows folded.
+
+    Each batch is claimed with DELETE ... RETURNING, so two dashboards folding
+    at once never count a delta twice, and all buckets are then upserted in
+    one go.
+    """
+    order_totals = defaultdict(lambda: [0, 0, 0])
+    item_totals = defaultdict(lambda: [0, 0])
+    folded = 0
+    try:
+        while True:
+            batch = select(PendingSale.pending_id).order_by(PendingSale.pending_id).limit(batch_size)
+            rows = session.execute(
+                delete(PendingSale).where(PendingSale.pending_id.in_(batch))
+                .returning(PendingSale.order_time, PendingSale.order_count, PendingSale.item_id,
+                           PendingSale.quantity, PendingSale.revenue)
+            ).all()
+            for order_time, order_count, item_id, qty, revenue in rows:
+                for period in PERIODS:
+                    bucket = bucket_start(period, order_time)
+                    if order_count:
+                        totals = order_totals[(period, bucket)]
+                        totals[0] += order_count
+                        totals[1] += qty or 0
+                        totals[2] += revenue or 0
+                    elif item_id is not None:
+                        item = item_totals[(period, bucket, item_id)]
+                        item[0] += qty or 0
+                        item[1] += revenue or 0
+            folded += len(rows)
+            if len(rows) < batch_size:
+                break
+        _apply(session, order_totals, item_totals)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return folded
+
+
+def rebuild_sales_rollups(session, batch_size=5000):
+    """Recompute all rollups from orders and archived_orders without committing.
+
+    Used to backfill history and after bulk deletes; rows are streamed in
+    batches so memory stays bounded by the number of buckets, not orders.
+    Queued deltas are dropped, since the orders they came from are counted here.
+    """
+    session.execute(delete(SalesRollup))
+    session.execute(delete(ItemSalesRollup))
+    session.execute(delete(PendingSale))
+
+    order_totals = defaultdict(lambda: [0, 0, 0])
+    item_totals = defaultdict(lambda: [0, 0])
+    sources = [
+        (Order, OrderItems, OrderItems.item_id),
+        (ArchivedOrder, ArchivedOrderItems, ArchivedOrderItems.menu_item_id),
+    ]
+    for order_model, item_model, item_col in sources:
+        for order_time, total_amount in (
+            session.query(order_model.order_time, order_model.total_amount)
+            .filter(order_model.order_time.isnot(None))
+            .yield_per(batch_size)
+        ):
+            _accumulate(order_totals, item_totals, order_time, total_amount, [], 1)
+
+        for order_time, item_id, qty, price in (
+            session.query(order_model.order_time, item_col, item_model.quantity, item_model.total_price)
+            .join(order_model, order_model.order_id == item_model.order_id)
+            .filter(order_model.order_time.isnot(None))
+            .yield_per(batch_size)
+        ):
+            for period in PERIODS:
+                bucket = bucket_start(period, order_time)
+                order_totals[(period, bucket)][1] += qty or 0
+                item = item_totals[(period, bucket, item_id)]
+                item[0] += qty or 0
+                item[1] += price or 0
+
+    _apply(session, order_totals, item_totals)
+
+
+def recompute_sales_rollups(session):
+    """Rebuild the sales rollups from every current and archived order, and commit."""
+    try:
+        rebuild_sales_rollups(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+
+def sales_totals(session):
+    """(order_count, item_count, revenue) over all orders, current and archived, as of the last fold."""
+    row = session.get(SalesRollup, ("all", ALL_TIME))
+    if row is None:
+        return 0, 0, 0
+    return row.order_count, row.item_count, row.revenue
+
+
+def sales_series(session, period, limit=30):
+    """The latest `limit` buckets of `period`, oldest first."""
+    rows = (
+        session.query(SalesRollup)
+        .filter(SalesRollup.period == period)
+        .order_by(SalesRollup.bucket_start.desc())
+        .limit(limit)
+        .all()
+    )
+    return rows[::-1]
+
+
+def top_items(session, limit=10):
+    """[(name, quantity, revenue)] for the best-selling items of all time."""
+    return (
+        session.query(MenuItem.name, ItemSalesRollup.quantity, ItemSalesRollup.revenue)
+        .outerjoin(MenuItem, MenuItem.item_id == ItemSalesRollup.item_id)
+        .filter(ItemSalesRollup.period == "all", ItemSalesRollup.quantity > 0)
+        .order_by(ItemSalesRollup.quantity.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def record_feedback(session, feedback):
+    """Add a new Feedback row's rating to the per-day and per-item rating rollups without committing.
+
+    The day is the day the rated order was placed; every menu item in that
+    order receives the rating.
+    """
+    order = session.get(Order, feedback.order_id)
+    if order is None or feedback.rating is None:
+        return
+    item_ids = session.scalars(
+        select(OrderItems.item_id).where(OrderItems.order_id == order.order_id).distinct()
+    ).all()
+    _upsert_add(session, DailyRating, ["day"], [
+        {"day": order.order_time.date(), "rating_count": 1, "rating_sum": feedback.rating}
+    ])
+    _upsert_add(session, ItemRating, ["item_id"], [
+        {"item_id": item_id, "rating_count": 1, "rating_sum": feedback.rating} for item_id in item_ids
+    ])
+
+
+def submit_feedback(session, user_id, order_id, rating, comments=None):
+    """Save a customer's feedback and its rating rollups in one commit."""
+    try:
+        fb = Feedback(user_id=user_id, order_id=order_id, rating=rating, comments=comments)
+        session.add(fb)
+        record_feedback(session, fb)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return fb
+
+
+def forget_archived_feedback(session, archived):
+    """Delete an ArchivedOrder's feedback and take its ratings back out of the rollups, without committing."""
+    ratings = [r for r in session.scalars(
+        delete(ArchivedFeedback).where(ArchivedFeedback.order_id == archived.order_id)
+        .returning(ArchivedFeedback.rating)
+    ).all() if r is not None]
+    if not ratings:
+        return
+    _upsert_add(session, DailyRating, ["day"], [
+        {"day": archived.order_time.date(), "rating_count": -len(ratings), "rating_sum": -sum(ratings)}
+    ])
+    _upsert_add(session, ItemRating, ["item_id"], [
+        {"item_id": item_id, "rating_count": -len(ratings), "rating_sum": -sum(ratings)}
+        for item_id in {i.menu_item_id for i in archived.items}
+    ])
+
+
+def rebuild_rating_rollups(session):
+    """Recompute the rating rollups from current and archived feedback with two INSERT ... SELECT statements.
+
+    Ratings on archived orders still count, as they do in the sales rollups.
+    """
+    session.execute(delete(DailyRating))
+    session.execute(delete(ItemRating))
+    ratings = union_all(
+        select(Feedback.order_id, Feedback.rating).where(Feedback.rating.isnot(None)),
+        select(ArchivedFeedback.order_id, ArchivedFeedback.rating).where(ArchivedFeedback.rating.isnot(None)),
+    ).subquery()
+    orders = union_all(
+        select(Order.order_id, Order.order_time),
+        select(ArchivedOrder.order_id, ArchivedOrder.order_time),
+    ).subquery()
+    # Distinct (order, item) pairs: every item in a rated order gets the rating once
+    items = union(
+        select(OrderItems.order_id, OrderItems.item_id),
+        select(ArchivedOrderItems.order_id, ArchivedOrderItems.menu_item_id),
+    ).subquery()
+    day = func.date(orders.c.order_time)
+    session.execute(insert(DailyRating).from_select(
+        ["day", "rating_count", "rating_sum"],
+        select(day, func.count(ratings.c.rating), func.sum(ratings.c.rating))
+        .join(orders, orders.c.order_id == ratings.c.order_id)
+        .group_by(day),
+    ))
+    session.execute(insert(ItemRating).from_select(
+        ["item_id", "rating_count", "rating_sum"],
+        select(items.c.item_id, func.count(ratings.c.rating), func.sum(ratings.c.rating))
+        .join(items, items.c.order_id == ratings.c.order_id)
+        .group_by(items.c.item_id),
+    ))
+
+
+def recompute_rating_rollups(session):
+    """Rebuild the rating rollups from current and archived feedback, and commit."""
+    try:
+        rebuild_rating_rollups(session)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+
+def daily_ratings(session, limit=30):
+    """[(day, average, count)] for the latest `limit` days with feedback, oldest first."""
+    rows = session.query(DailyRating).order_by(DailyRating.day.desc()).limit(limit).all()
+    return [(r.day, r.rating_sum / r.rating_count, r.rating_count) for r in reversed(rows) if r.rating_count]
+
+
+def item_ratings(session, min_count=1, limit=10, best=True):
+    """[(name, average, count)] for the best (or worst) rated menu items."""
+    average = ItemRating.rating_sum * 1.0 / ItemRating.rating_count
+    return (
+        session.query(MenuItem.name, average, ItemRating.rating_count)
+        .outerjoin(MenuItem, MenuItem.item_id == ItemRating.item_id)
+        .filter(ItemRating.rating_count >= min_count)
+        .order_by(average.desc() if best else average.asc())
+        .limit(limit)
+        .all()
+    )
+
+
+def feedback_page(session, page_size, after=None):
+    """(rows, next_cursor) for the feedback feed, newest first, with user and order joined in.
+
+    Feedback on archived orders keeps its feedback_id, so the live and archived
+    pages are merged on it. `after` is the feedback_id of the last row on the
+    previous page.
+    """
+    rows = []
+    for model in (Feedback, ArchivedFeedback):
+        query = session.query(model).options(joinedload(model.user), joinedload(model.order))
+        if after is not None:
+            query = query.filter(model.feedback_id < after)
+        rows += query.order_by(model.feedback_id.desc()).limit(page_size + 1).all()
+    rows.sort(key=lambda f: f.feedback_id, reverse=True)
+    rows = rows[:page_size + 1]
+    if len(rows) <= page_size:
+        return rows, None
+    return rows[:page_size], rows[page_size - 1].feedback_id
@@ -0,0 +1,168 @@
+import os
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from itertools import accumulate
+from models import Reservation, Table
+from orders import keyset_page
+
+# Length of a booking when none is given
+DEFAULT_DURATION = timedelta(minutes=int(os.environ.get("KHATA_RESERVATION_MINUTES", "90")))
+# No booking is longer than this, so a booking overlapping a window must start less
+# than MAX_DURATION before it; overlap queries use that as their lower bound
+MAX_DURATION = timedelta(hours=6)
+
+# Only these reservations hold a table
+BLOCKING_STATUSES = ("Confirmed",)
+
+
+class TableSchedule:
+    """Booked [start, end) intervals of one table, sorted by start for O(log n) overlap checks.
+
+    reach[i] is the latest end among the first i + 1 bookings, so a window is
+    free exactly when the bookings starting before it ends don't reach past its
+    start. That stays true for rows that overlap each other, e.g. ones booked
+    before overlaps were checked.
+    """
+
+    def __init__(self, intervals=()):
+        intervals = sorted(intervals)
+        self.starts = [start for start, _ in intervals]
+        self.reach = list(accumulate((end for _, end in intervals), max))
+
+    def is_free(self, start, end):
+        i = bisect_left(self.starts, end)
+        return i == 0 or self.reach[i - 1] <= start
+
+    def add(self, start, end):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.reach.insert(i, max(end, self.reach[i - 1]) if i else end)
+        # Later bookings now reach at least this far
+        for j in range(i + 1, len(self.reach)):
+            if self.reach[j] >= self.reach[j - 1]:
+                break
+            self.reach[j] = self.reach[j - 1]
+
+
+def all_tables(session):
+    """Every table, by table_id."""
+    return session.query(Table).order_by(Table.table_id).all()
+
+
+def _overlapping(query, start, end):
+    # Bounding reservation_time on both sides turns this into a range scan of the
+    # (table_id, reservation_time) / reservation_time indexes instead of all history
+    return query.filter(
+        Reservation.status.in_(BLOCKING_STATUSES),
+        Reservation.reservation_time > start - MAX_DURATION,
+        Reservation.reservation_time < end,
+        Reservation.end_time > start,
+    )
+
+
+def load_schedules(session, start, end):
+    """{table_id: TableSchedule} of blocking bookings that overlap [start, end), in one query."""
+    intervals = defaultdict(list)
+    rows = _overlapping(
+        session.query(Reservation.table_id, Reservation.reservation_time, Reservation.end_time), start, end
+    )
+    for table_id, res_start, res_end in rows:
+        intervals[table_id].append((res_start, res_end))
+    return defaultdict(TableSchedule, {tid: TableSchedule(iv) for tid, iv in intervals.items()})
+
+
+def free_tables(session, start, end, party_size=1, schedules=None):
+    """In-service tables seating `party_size` that are free for [start, end), smallest first.
+
+    Pass `schedules` from load_schedules() over a wider window (e.g. the whole
+    day) to answer many lookups without going back to the database.
+    """
+    if schedules is None:
+        schedules = load_schedules(session, start, end)
+    tables = (
+        session.query(Table)
+        .filter(Table.availability == True, Table.capacity >= party_size)
+        .order_by(Table.capacity, Table.table_id)
+        .all()
+    )
+    return [t for t in tables if schedules[t.table_id].is_free(start, end)]
+
+
+def find_best_table(session, party_size, start, end, schedules=None):
+    """The smallest free table that seats `party_size` for [start, end), or None."""
+    tables = free_tables(session, start, end, party_size, schedules)
+    return tables[0] if tables else None
+
+
+def book_table(session, user_id, table_id, start, duration=DEFAULT_DURATION, party_size=None, status="Confirmed"):
+    """Create a reservation and commit, raising ValueError if the table can't take it.
+
+    The table row is locked first, so two receptionists booking the same table
+    at once are serialized and the overlap check below stays valid. No booking
+    may last longer than MAX_DURATION.
+    """
+    if not timedelta(0) < duration <= MAX_DURATION:
+        raise ValueError(f"A booking can last at most {MAX_DURATION.seconds // 3600} hours.")
+    end = start + duration
+    try:
+        table = session.query(Table).filter(Table.table_id == table_id).with_for_update().first()
+        if table is None:
+            raise ValueError(f"Table {table_id} does not exist.")
+        if not table.availability:
+            raise ValueError(f"Table {table_id} is out of service.")
+        if party_size and table.capacity is not None and party_size > table.capacity:
+            raise ValueError(f"Table {table_id} seats {table.capacity}, not {party_size}.")
+        if status in BLOCKING_STATUSES:
+            clash = _overlapping(session.query(Reservation.reservation_id), start, end) \
+                .filter(Reservation.table_id == table_id).first()
+            if clash:
+                raise ValueError(f"Table {table_id} is already booked between "
+                                 f"{start:%H:%M} and {end:%H:%M} (reservation #{clash.reservation_id}).")
+
+        reservation = Reservation(
+            user_id=user_id,
+            table_id=table_id,
+            reservation_time=start,
+            end_time=end,
+            party_size=party_size,
+            status=status
+        )
+        session.add(reservation)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return reservation
+
+
+def reservations_between(session, start, end):
+    """Reservations starting in [start, end), earliest first.
+
+    Plain range predicates on reservation_time (rather than DATE(...) = ...)
+    so the ix_reservations_time index is used.
+    """
+    return (
+        session.query(Reservation)
+        .filter(Reservation.reservation_time >= start, Reservation.reservation_time < end)
+        .order_by(Reservation.reservation_time, Reservation.reservation_id)
+        .all()
+    )
+
+
+def reservations_on(session, day):
+    """Reservations starting on `day` (a date)."""
+    start = datetime.combine(day, time.min)
+    return reservations_between(session, start, start + timedelta(days=1))
+
+
+def upcoming_reservations(session, hours, now=None):
+    """Reservations starting within the next `hours` hours."""
+    now = now or datetime.now()
+    return reservations_between(session, now, now + timedelta(hours=hours))
+
+
+def reservation_page(session, page_size, after=None, start=None, end=None):
+    """(rows, next_cursor) of reservations, latest first, keyset-paginated on (reservation_time, reservation_id)."""
+    return keyset_page(session.query(Reservation), Reservation.reservation_time, Reservation.reservation_id,
+                       page_size, after, start, end)
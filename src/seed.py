@@ -0,0 +1,292 @@
+"""Fill the database at KHATA_DB_URL with synthetic restaurant data for load testing.
+
+    python seed.py --orders 1000000 --days 365
+
+Every volume is a flag (see --help). Ids continue after the current maximum,
+so it can be run against a database that already has data. Order times
+follow lunch and dinner peaks with busier weekends, and menu items are
+picked with Zipfian popularity, so a few dishes dominate like they do in a
+real restaurant. Orders older than --archive-after days are written straight
+to the archive tables. Rows are loaded in batches with COPY on PostgreSQL
+and multi-row INSERTs elsewhere, and the sales and rating rollups and a stock
+snapshot are rebuilt at the end.
+"""
+import argparse
+import csv
+import io
+import itertools
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func, select, text
+from db import engine, Session
+from models import User, Table, MenuItem, Inventory, Order, OrderItems, ArchivedOrder, ArchivedOrderItems, \
+    Feedback, ArchivedFeedback, Reservation, RecipeItem
+from accounts import hash_password
+from reports import rebuild_sales_rollups, rebuild_rating_rollups
+from stock import stock_out_menu_items, take_snapshot
+
+CATEGORIES = {"Starter": (250, 900), "Main Course": (600, 2500), "Drink": (100, 450), "Dessert": (200, 800)}
+
+# Relative order volume per hour of day: quiet mornings, lunch and dinner rushes
+HOUR_WEIGHTS = [0, 0, 0, 0, 0, 0, 0, 1, 2, 2, 3, 5, 12, 14, 9, 4, 3, 4, 8, 14, 15, 11, 6, 2]
+WEEKEND_FACTOR = 1.4
+
+LINES_PER_ORDER = [1, 2, 3, 4, 5, 6]
+LINES_WEIGHTS = [20, 30, 25, 13, 8, 4]
+LINES_MEAN = sum(n * w for n, w in zip(LINES_PER_ORDER, LINES_WEIGHTS)) / sum(LINES_WEIGHTS)
+RATING_WEIGHTS = [5, 7, 15, 33, 40]  # 1..5 stars
+
+RESERVATION_SLOTS = [12, 14, 18, 20, 22]  # start hours; 90-minute bookings never overlap
+RESERVATION_LENGTH = timedelta(minutes=90)
+
+
+def _batched(rows, size):
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+
+def _load(conn, table, columns, rows):
+    """Write a batch of row tuples: COPY on PostgreSQL (psycopg2), executemany INSERT otherwise."""
+    if not rows:
+        return
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2":
+        buf = io.StringIO()
+        csv.writer(buf).writerows(rows)  # None becomes an unquoted empty field, i.e. NULL
+        buf.seek(0)
+        cols = ", ".join(f'"{c}"' for c in columns)
+        with conn.connection.dbapi_connection.cursor() as cur:
+            cur.copy_expert(f'COPY "{table.name}" ({cols}) FROM STDIN WITH (FORMAT csv)', buf)
+    else:
+        conn.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+
+
+def load(model, columns, rows, batch_size):
+    """Stream `rows` into `model`'s table, one transaction per batch. Returns the row count."""
+    count = 0
+    for batch in _batched(rows, batch_size):
+        with engine.begin() as conn:
+            _load(conn, model.__table__, columns, batch)
+        count += len(batch)
+    return count
+
+
+def next_id(column):
+    with engine.connect() as conn:
+        return (conn.scalar(select(func.max(column))) or 0) + 1
+
+
+def _reset_sequences():
+    # Ids were written explicitly, so move PostgreSQL's SERIAL sequences past them
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for model in (User, Table, MenuItem, Inventory, Order, OrderItems, ArchivedOrderItems, Feedback, Reservation):
+            table = model.__table__
+            pk = table.primary_key.columns.values()[0].name
+            conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence(:table, :pk), "
+                f"COALESCE((SELECT max({pk}) FROM \"{table.name}\"), 1))"
+            ), {"table": f'"{table.name}"', "pk": pk})
+
+
+def zipf_weights(n, s):
+    """Cumulative Zipf weights for ranks 1..n (rank 1 is the most popular)."""
+    return list(itertools.accumulate(1 / rank ** s for rank in range(1, n + 1)))
+
+
+def order_times(rng, count, start_day, days, now):
+    """`count` datetimes spread over `days` days from `start_day` up to `now`, oldest first.
+
+    Days are weighted towards weekends and hours towards lunch and dinner.
+    """
+    day_weights = [WEEKEND_FACTOR if (start_day + timedelta(days=d)).weekday() >= 5 else 1.0 for d in range(days)]
+    total = sum(day_weights)
+    per_day = [int(count * w / total) for w in day_weights]
+    for d in rng.sample(range(days), count - sum(per_day)):
+        per_day[d] += 1
+    for d, n in enumerate(per_day):
+        day = start_day + timedelta(days=d)
+        hours = range(24) if day.date() < now.date() else range(now.hour + 1)
+        weights = [HOUR_WEIGHTS[h] or 0.1 for h in hours]  # a floor for the quiet hours, so early on the last day is never empty
+        times = []
+        for h in rng.choices(hours, weights=weights, k=n):
+            seconds = 3600 if h < now.hour or day.date() < now.date() else now.minute * 60 + now.second + 1
+            times.append(day + timedelta(hours=h, seconds=rng.randrange(seconds)))
+        yield from sorted(times)
+
+
+def seed(args):
+    rng = random.Random(args.seed)
+    now = datetime.utcnow().replace(microsecond=0)
+    start_day = (now - timedelta(days=args.days - 1)).replace(hour=0, minute=0, second=0)
+    started = time.perf_counter()
+
+    def report(name, count):
+        print(f"{name:<22} {count:>10,} rows  ({time.perf_counter() - started:.1f}s)")
+
+    # Customers share one password hash: hashing millions of passwords would dominate the load
+    password = hash_password("password")
+    first_user = next_id(User.user_id)
+    staff_roles = ["Admin", "Staff", "Staff", "Receptionist"]
+    roles = staff_roles + ["Customer"] * args.users
+    report("users", load(User, ["user_id", "name", "role", "contact", "email", "password"], (
+        (first_user + i, f"{role} {first_user + i}", role, f"03{rng.randrange(10 ** 9):09d}",
+         f"{role.lower()}{first_user + i}@example.com", password)
+        for i, role in enumerate(roles)
+    ), args.batch_size))
+    customer_ids = range(first_user + len(staff_roles), first_user + len(roles))
+
+    first_table = next_id(Table.table_id)
+    capacities = [rng.choice([2, 2, 4, 4, 4, 6, 8]) for _ in range(args.tables)]
+    report("tables", load(Table, ["table_id", "capacity", "availability"], (
+        (first_table + i, capacity, True) for i, capacity in enumerate(capacities)
+    ), args.batch_size))
+
+    first_item = next_id(MenuItem.item_id)
+    menu = []
+    for i in range(args.menu_items):
+        category = rng.choice(list(CATEGORIES))
+        low, high = CATEGORIES[category]
+        menu.append((first_item + i, f"{category} {first_item + i}", category, rng.randrange(low, high, 10)))
+    report("menu_items", load(MenuItem, ["item_id", "name", "category", "price", "availability", "ingredients",
+                                         "stock_out"], (
+        (item_id, name, category, price, True, "", False) for item_id, name, category, price in menu
+    ), args.batch_size))
+
+    first_stock = next_id(Inventory.item_id)
+    report("inventory", load(Inventory, ["item_id", "name", "quantity", "expiry_date", "supplier_id"], (
+        (first_stock + i, f"Ingredient {first_stock + i}", rng.randrange(0, 500),
+         (now + timedelta(days=rng.randrange(-5, 90))).date(), rng.randrange(1, args.suppliers + 1))
+        for i in range(args.inventory)
+    ), args.batch_size))
+
+    # Each dish uses a few ingredients, so placing orders depletes stock
+    report("recipe_items", load(RecipeItem, ["menu_item_id", "inventory_item_id", "quantity"], (
+        (item_id, first_stock + ingredient, rng.randint(1, 3))
+        for item_id, *_ in menu
+        for ingredient in rng.sample(range(args.inventory), min(args.inventory, rng.randint(2, 4)))
+    ), args.batch_size))
+
+    # Orders, line items and feedback are generated together and written chunk by chunk
+    by_popularity = menu[:]
+    rng.shuffle(by_popularity)
+    popularity = zipf_weights(len(by_popularity), args.zipf)
+    line_scale = args.lines_per_order / LINES_MEAN
+    archive_before = now - timedelta(days=args.archive_after)
+    live_from = now - timedelta(hours=2)
+    order_id = max(next_id(Order.order_id), next_id(ArchivedOrder.order_id))
+    line_id = next_id(OrderItems.order_item_id)
+    archived_line_id = next_id(ArchivedOrderItems.item_id)
+    feedback_id = max(next_id(Feedback.feedback_id), next_id(ArchivedFeedback.feedback_id))
+    counts = dict.fromkeys(["orders", "OrderItems", "archived_orders", "archived_order_items", "feedback"], 0)
+
+    order_cols = ["order_id", "user_id", "table_id", "status", "total_amount", "payment_status", "order_time",
+                  "updated_at", "version"]
+    archived_cols = ["order_id", "user_id", "table_id", "status", "total_amount", "payment_status", "order_time",
+                     "archive_time"]
+    line_cols = ["order_item_id", "order_id", "item_id", "quantity", "total_price"]
+    archived_line_cols = ["item_id", "order_id", "menu_item_id", "quantity", "total_price", "item_name", "unit_price"]
+    feedback_cols = ["feedback_id", "user_id", "order_id", "rating", "comments"]
+
+    for times in _batched(order_times(rng, args.orders, start_day, args.days, now), args.batch_size):
+        orders, lines, archived, archived_lines, feedback = [], [], [], [], []
+        for order_time in times:
+            user_id = rng.choice(customer_ids)
+            table_id = first_table + rng.randrange(args.tables)
+            size = rng.choices(LINES_PER_ORDER, weights=LINES_WEIGHTS)[0]
+            size = min(len(menu), max(1, round(size * line_scale)))
+            order_lines = {}
+            while len(order_lines) < size:  # a dish picked twice is one line with a bigger quantity
+                for item in rng.choices(by_popularity, cum_weights=popularity, k=size - len(order_lines)):
+                    order_lines[item] = order_lines.get(item, 0) + rng.choice([1, 1, 1, 2, 2, 3])
+            total = sum(item[3] * qty for item, qty in order_lines.items())
+
+            if order_time < archive_before:
+                archived.append((order_id, user_id, table_id, "Archived", total, "Paid", order_time,
+                                 order_time + timedelta(days=args.archive_after)))
+                for (item_id, name, _, price), qty in order_lines.items():
+                    archived_lines.append((archived_line_id, order_id, item_id, qty, price * qty, name, price))
+                    archived_line_id += 1
+            else:
+                status = rng.choice(["Pending", "In Progress", "Completed"]) if order_time >= live_from else "Completed"
+                orders.append((order_id, user_id, table_id, status, total,
+                               "Paid" if status == "Completed" else "Unpaid", order_time, order_time, 1))
+                for (item_id, _, _, price), qty in order_lines.items():
+                    lines.append((line_id, order_id, item_id, qty, price * qty))
+                    line_id += 1
+                if status == "Completed" and rng.random() < args.feedback_rate:
+                    rating = rng.choices(range(1, 6), weights=RATING_WEIGHTS)[0]
+                    feedback.append((feedback_id, user_id, order_id, rating, f"Rated {rating} stars"))
+                    feedback_id += 1
+            order_id += 1
+
+        with engine.begin() as conn:
+            _load(conn, Order.__table__, order_cols, orders)
+            _load(conn, OrderItems.__table__, line_cols, lines)
+            _load(conn, ArchivedOrder.__table__, archived_cols, archived)
+            _load(conn, ArchivedOrderItems.__table__, archived_line_cols, archived_lines)
+            _load(conn, Feedback.__table__, feedback_cols, feedback)
+        for name, rows in zip(counts, (orders, lines, archived, archived_lines, feedback)):
+            counts[name] += len(rows)
+    for name, count in counts.items():
+        report(name, count)
+
+    # Reservations fill distinct (table, day, slot) cells, from `days` ago to a week ahead
+    first_reservation = next_id(Reservation.reservation_id)
+    slot_days = args.days + 7
+    cells = args.tables * slot_days * len(RESERVATION_SLOTS)
+    picked = rng.sample(range(cells), min(args.reservations, cells))
+
+    def reservations():
+        for n, cell in enumerate(picked):
+            table, rest = divmod(cell, slot_days * len(RESERVATION_SLOTS))
+            day, slot = divmod(rest, len(RESERVATION_SLOTS))
+            start = start_day + timedelta(days=day, hours=RESERVATION_SLOTS[slot])
+            status = rng.choices(["Confirmed", "Cancelled", "No-Show"], weights=[85, 10, 5])[0]
+            yield (first_reservation + n, rng.choice(customer_ids), first_table + table, start,
+                   start + RESERVATION_LENGTH, rng.randint(1, capacities[table]), status)
+
+    report("reservations", load(Reservation, ["reservation_id", "user_id", "table_id", "reservation_time",
+                                              "end_time", "party_size", "status"], reservations(), args.batch_size))
+
+    _reset_sequences()
+    session = Session()
+    try:
+        rebuild_sales_rollups(session)
+        rebuild_rating_rollups(session)
+        stock_out_menu_items(session)  # dishes seeded without enough stock for a portion
+        take_snapshot(session)
+        session.commit()
+    finally:
+        Session.remove()
+    report("rollups and snapshot", 0)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load synthetic data into the Khata database (KHATA_DB_URL).")
+    parser.add_argument("--users", type=int, default=10_000, help="customers to create")
+    parser.add_argument("--tables", type=int, default=40)
+    parser.add_argument("--menu-items", type=int, default=120)
+    parser.add_argument("--inventory", type=int, default=300)
+    parser.add_argument("--suppliers", type=int, default=15)
+    parser.add_argument("--orders", type=int, default=200_000, help="orders, current and archived")
+    parser.add_argument("--days", type=int, default=365, help="history length, ending today")
+    parser.add_argument("--lines-per-order", type=float, default=round(LINES_MEAN, 2),
+                        help="average distinct menu items per order")
+    parser.add_argument("--archive-after", type=int, default=90, help="orders older than this many days are archived")
+    parser.add_argument("--feedback-rate", type=float, default=0.1, help="share of completed orders with feedback")
+    parser.add_argument("--reservations", type=int, default=20_000)
+    parser.add_argument("--zipf", type=float, default=1.1, help="menu popularity skew; higher is more skewed")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42, help="random seed, for repeatable data sets")
+    return parser.parse_args(argv)
+
+
+def main():
+    seed(parse_args())
+
+
+if __name__ == "__main__":
+    main()
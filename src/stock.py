@@ -0,0 +1,285 @@
+import os
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import case, select, update, insert, func, literal
+from sqlalchemy.orm import joinedload
+from models import Inventory, MenuItem, RecipeItem, StockMovement, StockSnapshot
+
+# How often a full stock snapshot is taken; bounds the ledger scanned by stock_at()
+SNAPSHOT_EVERY = timedelta(hours=float(os.environ.get("KHATA_STOCK_SNAPSHOT_HOURS", "24")))
+
+
+def _log_movements(session, changes, reason, order_id=None):
+    """Append {inventory_item_id: change} to the stock ledger in one INSERT, snapshotting if one is due.
+
+    Callers update Inventory first, so a snapshot taken here already includes
+    these changes and is stamped after them.
+    """
+    if changes:
+        now = datetime.utcnow()
+        session.execute(insert(StockMovement), [
+            {"inventory_item_id": item_id, "change": change, "reason": reason, "order_id": order_id, "moved_at": now}
+            for item_id, change in changes.items()
+        ])
+        snapshot_if_due(session)
+
+
+def deplete_stock(session, quantities, order_id=None):
+    """Take the ingredients for an order out of inventory without committing.
+
+    `quantities` maps menu item_id -> quantity ordered. All affected inventory
+    rows are decremented by one UPDATE ... CASE that only matches rows with
+    enough stock; if any row is short ValueError is raised and the caller must
+    roll back. Consumption is appended to the stock ledger. Menu items left
+    without enough of any ingredient for one more portion are then marked
+    unavailable by stock_out_menu_items(). Returns True if that changed the menu.
+    """
+    needs = defaultdict(int)
+    for menu_item_id, inventory_item_id, per_portion in session.execute(
+        select(RecipeItem.menu_item_id, RecipeItem.inventory_item_id, RecipeItem.quantity)
+        .where(RecipeItem.menu_item_id.in_(list(quantities)))
+    ):
+        needs[inventory_item_id] += per_portion * quantities[menu_item_id]
+    needs = {item_id: need for item_id, need in needs.items() if need > 0}
+    if not needs:
+        return False
+
+    need = case(needs, value=Inventory.item_id, else_=0)
+    updated = session.execute(
+        update(Inventory)
+        .where(Inventory.item_id.in_(list(needs)), Inventory.quantity >= need)
+        .values(quantity=Inventory.quantity - need)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if updated != len(needs):
+        short = session.scalars(
+            select(Inventory.name).where(Inventory.item_id.in_(list(needs)), Inventory.quantity < need)
+        ).all()
+        raise ValueError(f"Not enough stock for: {', '.join(short) or 'some ingredients'}.")
+    _log_movements(session, {item_id: -n for item_id, n in needs.items()}, "consumption", order_id)
+    return stock_out_menu_items(session, list(needs))
+
+
+def stock_out_menu_items(session, inventory_item_ids=None):
+    """Switch off (and mark stock_out) available menu items that can't make one more portion, without committing.
+
+    Only recipes using `inventory_item_ids` are checked, or every recipe if it
+    is None. Returns True if the menu changed.
+    """
+    short_items = (
+        select(RecipeItem.menu_item_id)
+        .join(Inventory, Inventory.item_id == RecipeItem.inventory_item_id)
+        .where(Inventory.quantity < RecipeItem.quantity)
+    )
+    if inventory_item_ids is not None:
+        short_items = short_items.where(RecipeItem.inventory_item_id.in_(inventory_item_ids))
+    toggled = session.execute(
+        update(MenuItem)
+        .where(MenuItem.availability == True, MenuItem.item_id.in_(short_items))
+        .values(availability=False, stock_out=True)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return toggled > 0
+
+
+def restock_menu_items(session):
+    """Make items that were switched off for lack of stock available again once every
+    ingredient covers a portion, without committing. Returns True if the menu changed."""
+    still_short = (
+        select(RecipeItem.menu_item_id)
+        .join(Inventory, Inventory.item_id == RecipeItem.inventory_item_id)
+        .where(Inventory.quantity < RecipeItem.quantity)
+    )
+    restored = session.execute(
+        update(MenuItem)
+        .where(MenuItem.stock_out == True, MenuItem.item_id.not_in(still_short))
+        .values(availability=True, stock_out=False)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return restored > 0
+
+
+def add_stock_item(session, name, quantity, expiry_date=None, supplier_id=None):
+    """Create an inventory item with its opening stock recorded as a receipt, and commit."""
+    item = Inventory(name=name, quantity=quantity, expiry_date=expiry_date, supplier_id=supplier_id)
+    session.add(item)
+    session.flush()
+    _log_movements(session, {item.item_id: quantity}, "receipt")
+    session.commit()
+    return item
+
+
+def receive_stock(session, item_id, quantity):
+    """Add a delivery to stock, log it and re-enable dishes it makes possible; commits.
+
+    Returns True if the menu changed.
+    """
+    session.execute(
+        update(Inventory).where(Inventory.item_id == item_id)
+        .values(quantity=Inventory.quantity + quantity)
+        .execution_options(synchronize_session=False)
+    )
+    _log_movements(session, {item_id: quantity}, "receipt")
+    menu_changed = restock_menu_items(session)
+    session.commit()
+    return menu_changed
+
+
+def record_waste(session, item_id, quantity):
+    """Write off spoiled or lost stock (never below zero), log it, switch off dishes it
+    leaves short and commit.
+
+    Returns (amount actually written off, True if the menu changed).
+    """
+    menu_changed = False
+    try:
+        current = session.scalar(
+            select(Inventory.quantity).where(Inventory.item_id == item_id).with_for_update()
+        ) or 0
+        wasted = min(quantity, current)
+        if wasted:
+            session.execute(
+                update(Inventory).where(Inventory.item_id == item_id)
+                .values(quantity=Inventory.quantity - wasted)
+                .execution_options(synchronize_session=False)
+            )
+            _log_movements(session, {item_id: -wasted}, "waste")
+            menu_changed = stock_out_menu_items(session, [item_id])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    return wasted, menu_changed
+
+
+def take_snapshot(session, now=None):
+    """Copy every item's current quantity into stock_snapshots with one INSERT ... SELECT (no commit).
+
+    Every item gets a row (a NULL quantity as 0), so an item missing from a
+    snapshot is one that was created after it.
+    """
+    now = now or datetime.utcnow()
+    session.execute(insert(StockSnapshot).from_select(
+        ["inventory_item_id", "taken_at", "quantity"],
+        select(Inventory.item_id, literal(now), func.coalesce(Inventory.quantity, 0)),
+    ))
+
+
+def snapshot_if_due(session):
+    """Take a snapshot if the latest one is older than SNAPSHOT_EVERY, without committing. Returns True if taken.
+
+    Every write to the stock ledger calls this, so the ledger stock_at() has
+    to replay never spans more than SNAPSHOT_EVERY of stock activity.
+    """
+    now = datetime.utcnow()
+    latest = session.scalar(select(func.max(StockSnapshot.taken_at)))
+    if latest is not None and now - latest < SNAPSHOT_EVERY:
+        return False
+    take_snapshot(session, now)
+    return True
+
+
+def stock_at(session, moment):
+    """{inventory_item_id: quantity} as of `moment`.
+
+    Starts from the latest snapshot at or before `moment` and adds the ledger
+    entries between the two, read through the moved_at index, so the scan is
+    bounded by the snapshot interval instead of the whole history. Items
+    created after that snapshot aren't in it and start from 0 plus their
+    opening receipt. Before the first snapshot the ledger is summed from its
+    start.
+    """
+    taken_at = session.scalar(select(func.max(StockSnapshot.taken_at)).where(StockSnapshot.taken_at <= moment))
+    movements = select(StockMovement.inventory_item_id, func.sum(StockMovement.change)) \
+        .where(StockMovement.moved_at <= moment).group_by(StockMovement.inventory_item_id)
+    stock = {}
+    if taken_at is not None:
+        stock = dict(session.execute(
+            select(StockSnapshot.inventory_item_id, StockSnapshot.quantity).where(StockSnapshot.taken_at == taken_at)
+        ).all())
+        movements = movements.where(StockMovement.moved_at > taken_at)
+
+    for item_id, delta in session.execute(movements):
+        stock[item_id] = stock.get(item_id, 0) + (delta or 0)
+    return stock
+
+
+def stock_items(session):
+    """Every inventory item, by name."""
+    return session.query(Inventory).order_by(Inventory.name).all()
+
+
+def set_recipe_item(session, menu_item_id, inventory_item_id, quantity):
+    """Set how much of an inventory item one portion of a menu item uses, and commit."""
+    session.merge(RecipeItem(menu_item_id=menu_item_id, inventory_item_id=inventory_item_id, quantity=quantity))
+    session.commit()
+
+
+def recipe_lines(session):
+    """Every RecipeItem with its menu and inventory item loaded, grouped by menu item."""
+    return (
+        session.query(RecipeItem)
+        .options(joinedload(RecipeItem.menu_item), joinedload(RecipeItem.inventory_item))
+        .order_by(RecipeItem.menu_item_id)
+        .all()
+    )
+
+
+def expiring_items(session, within_days, today=None):
+    """Inventory expiring within `within_days` days (already expired included), soonest first."""
+    cutoff = (today or date.today()) + timedelta(days=within_days)
+    return (
+        session.query(Inventory)
+        .filter(Inventory.expiry_date <= cutoff)
+        .order_by(Inventory.expiry_date, Inventory.item_id)
+        .all()
+    )
+
+
+def low_stock_items(session, threshold):
+    """Inventory with quantity below `threshold`, emptiest first."""
+    return (
+        session.query(Inventory)
+        .filter(Inventory.quantity < threshold)
+        .order_by(Inventory.quantity, Inventory.item_id)
+        .all()
+    )
+
+
+def reorder_lists(session, threshold, target):
+    """Per-supplier reorder lists for items below `threshold`, topping each up to `target`.
+
+    Returns [(supplier_id, item_count, units_to_order, [(name, quantity, order_quantity)])]
+    with the totals aggregated in SQL. Raises ValueError if `target` is below
+    `threshold`, which would order nothing (or negative amounts) for some items.
+    """
+    if target < threshold:
+        raise ValueError(f"Reorder up to quantity ({target}) can't be below the reorder level ({threshold}).")
+    low = Inventory.quantity < threshold
+    order_qty = target - Inventory.quantity
+    totals = (
+        session.query(Inventory.supplier_id, func.count(Inventory.item_id), func.sum(order_qty))
+        .filter(low)
+        .group_by(Inventory.supplier_id)
+        .order_by(Inventory.supplier_id)
+        .all()
+    )
+    lines = defaultdict(list)
+    for supplier_id, name, quantity, qty in (
+        session.query(Inventory.supplier_id, Inventory.name, Inventory.quantity, order_qty)
+        .filter(low)
+        .order_by(Inventory.supplier_id, Inventory.name)
+    ):
+        lines[supplier_id].append((name, quantity, qty))
+    return [(supplier_id, count, units, lines[supplier_id]) for supplier_id, count, units in totals]
+
+
+def inventory_page(session, page_size, after=None):
+    """(rows, next_cursor) of all inventory ordered by item_id; `after` is the last item_id shown."""
+    query = session.query(Inventory)
+    if after is not None:
+        query = query.filter(Inventory.item_id > after)
+    rows = query.order_by(Inventory.item_id).limit(page_size + 1).all()
+    if len(rows) <= page_size:
+        return rows, None
+    return rows[:page_size], rows[page_size - 1].item_id
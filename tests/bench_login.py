@@ -0,0 +1,74 @@
+"""Login latency at the configured scrypt cost (KHATA_SCRYPT_N/R/P, KHATA_LOGIN_WORKERS).
+
+    python -m pytest tests/bench_login.py
+
+Reports p50/p99 in the benchmark's extra_info, both for one login at a time
+and for a storm of concurrent logins queueing for the verification pool.
+"""
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+import accounts
+from accounts import authenticate, hash_password
+from models import User
+
+pytest.importorskip("pytest_benchmark")
+
+STORM = 64  # people logging in at shift start
+
+
+def _percentiles(latencies):
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {"p50_ms": round(cuts[49] * 1000, 1), "p99_ms": round(cuts[98] * 1000, 1)}
+
+
+@pytest.fixture
+def staff(engine):
+    # One shared hash, like seed.py: hashing every account would dominate the setup
+    stored = hash_password("password")
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"name": f"Staff {n}", "role": "Staff", "email": f"staff{n}@example.com", "password": stored}
+            for n in range(STORM)
+        ])
+    return sessionmaker(bind=engine)
+
+
+def test_login_latency(benchmark, staff):
+    session = staff()
+    latencies = []
+
+    def login():
+        started = time.perf_counter()
+        user = authenticate(session, "staff0@example.com", "password")
+        latencies.append(time.perf_counter() - started)
+        return user
+
+    assert benchmark.pedantic(login, rounds=30, iterations=1, warmup_rounds=1) is not None
+    benchmark.extra_info.update(_percentiles(latencies), scrypt_n=accounts.SCRYPT_N)
+    session.close()
+
+
+def test_login_storm_latency(benchmark, staff):
+    def storm():
+        start = threading.Barrier(STORM)
+
+        def login(n):
+            with staff() as session:
+                start.wait()
+                started = time.perf_counter()
+                assert authenticate(session, f"staff{n}@example.com", "password") is not None
+                return time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=STORM) as pool:
+            return list(pool.map(login, range(STORM)))
+
+    latencies = benchmark.pedantic(storm, rounds=3, iterations=1)
+    stats = _percentiles(latencies)
+    benchmark.extra_info.update(stats, logins=STORM, workers=accounts.LOGIN_WORKERS)
+    # Queued logins wait for a worker but finish well inside the timeout
+    assert stats["p99_ms"] < accounts.LOGIN_TIMEOUT * 1000
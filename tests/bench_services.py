@@ -0,0 +1,256 @@
+"""Latency of the service functions behind each page, on a seeded SQLite database.
+
+    python -m pytest tests/bench_services.py
+    python -m pytest tests/bench_services.py --benchmark-json=bench.json   # to compare runs
+
+The database is generated once per run with seed.py at realistic volumes:
+KHATA_BENCH_ORDERS orders (default 100,000) with KHATA_BENCH_LINES_PER_ORDER
+line items each on average (default 10, so about 1M line items). To reuse a
+database between runs, point KHATA_DB_URL at a SQLite file; it is only seeded
+while it has no orders. Benchmarks that write (placing orders, bookings,
+archiving) add to it.
+"""
+import io
+import itertools
+import os
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import delete, func, insert, select, update
+import db
+import seed
+from analytics import clear_analytics_cache, menu_analytics
+from accounts import user_page
+from catalogue import bump_menu_version, cached_menu
+from exports import FORMATS, export_file, write_csv
+from models import Order, OrderItems, ArchivedOrder, ArchivedOrderItems, Inventory, MenuItem, RecipeItem, Reservation, \
+    StockMovement, Table, User
+from orders import KitchenBoard, archive_completed_orders, archived_order_page, create_order, order_page
+from reports import fold_pending_sales, sales_series, sales_totals, top_items
+from reservations import book_table, find_best_table, reservations_on
+from stock import reorder_lists, restock_menu_items, stock_at
+
+pytest.importorskip("pytest_benchmark")
+
+ORDERS = int(os.environ.get("KHATA_BENCH_ORDERS", "100000"))
+LINES_PER_ORDER = float(os.environ.get("KHATA_BENCH_LINES_PER_ORDER", "10"))
+
+
+@pytest.fixture(scope="session")
+def seeded():
+    with db.engine.connect() as conn:
+        empty = not conn.scalar(select(func.count()).select_from(Order))
+    if empty:
+        seed.seed(seed.parse_args(["--orders", str(ORDERS), "--lines-per-order", str(LINES_PER_ORDER)]))
+    with db.engine.connect() as conn:
+        customer = conn.scalar(select(User.user_id).where(User.role == "Customer").limit(1))
+        tables = conn.scalars(select(Table.table_id).order_by(Table.table_id)).all()
+        menu = conn.scalars(select(MenuItem.item_id).order_by(MenuItem.item_id)).all()
+        lines = conn.scalar(select(func.count()).select_from(OrderItems)) + \
+            conn.scalar(select(func.count()).select_from(ArchivedOrderItems))
+    print(f"\nbenchmark database: {lines:,} line items")
+    return customer, tables, menu
+
+
+@pytest.fixture
+def session(seeded):
+    yield db.Session()
+    db.Session.remove()
+
+
+@pytest.fixture(scope="session")
+def stocked(seeded):
+    """Top up every recipe ingredient so order benchmarks never run short, however often they run."""
+    session = db.Session()
+    try:
+        session.execute(update(Inventory).where(Inventory.item_id.in_(select(RecipeItem.inventory_item_id)))
+                        .values(quantity=Inventory.quantity + 100_000))
+        restock_menu_items(session)
+        session.commit()
+    finally:
+        db.Session.remove()
+    bump_menu_version()
+    return seeded
+
+
+def _place_row_by_row(session, user_id, table_id, quantities):
+    # How place_order() used to do it: commit the order, then one get() per item and a second commit
+    order = Order(user_id=user_id, table_id=table_id, total_amount=0, status="Pending", payment_status="Unpaid")
+    session.add(order)
+    session.commit()
+    for item_id, qty in quantities.items():
+        menu_item = session.get(MenuItem, item_id)
+        if menu_item:
+            session.add(OrderItems(order_id=order.order_id, item_id=menu_item.item_id, quantity=qty,
+                                   total_price=menu_item.price * qty))
+    session.commit()
+    return order
+
+
+@pytest.mark.parametrize("place", [_place_row_by_row, create_order], ids=["before", "after"])
+def test_place_order(benchmark, stocked, session, place):
+    # Both variants land in one 'place order' table, so the speed-up is the OPS column ratio.
+    # create_order() also depletes the seeded recipes' ingredients in the same transaction.
+    customer, tables, menu = stocked
+    movements = session.scalar(select(func.count()).select_from(StockMovement))
+    picks = itertools.count()
+    benchmark.group = "place order"
+
+    def run():
+        n = next(picks)
+        return place(session, customer, tables[n % len(tables)],
+                     {menu[(n + i * 7) % len(menu)]: 1 + i % 2 for i in range(3)})
+
+    benchmark.pedantic(run, rounds=200, iterations=1, warmup_rounds=5)
+    benchmark.extra_info["orders_per_second"] = round(1 / benchmark.stats.stats.median)
+    print(f"\n{place.__name__}: {benchmark.extra_info['orders_per_second']:,} orders/s")
+    if place is create_order:
+        assert session.scalar(select(func.count()).select_from(StockMovement)) > movements
+
+
+def test_track_orders_page(benchmark, session):
+    def render():
+        session.expire_all()
+        orders, _ = order_page(session, 50)
+        return sum(len(o.order_items) for o in orders if o.user)
+
+    assert benchmark(render) > 0
+
+
+def test_archived_orders_page(benchmark, session):
+    def render():
+        session.expire_all()
+        rows, _ = archived_order_page(session, 50, start=date.today() - timedelta(days=365))
+        return [(i.item_name, i.quantity) for a in rows for i in a.items]
+
+    assert benchmark(render)
+
+
+def test_kitchen_board_poll(benchmark, session):
+    board = KitchenBoard()
+    board.refresh(session)
+    benchmark(board.refresh, session)
+
+
+def test_sales_dashboard(benchmark, session):
+    def render():
+        fold_pending_sales(session)
+        session.expire_all()
+        return sales_totals(session), sales_series(session, "day", 30), top_items(session)
+
+    totals, series, best = benchmark(render)
+    assert totals[0] and series and best
+
+
+def test_menu_analytics_30_days(benchmark, session):
+    end = date.today()
+
+    def run():
+        clear_analytics_cache()  # measure the computation, not the cache
+        return menu_analytics(session, end - timedelta(days=30), end)
+
+    assert benchmark.pedantic(run, rounds=5, iterations=1).lines
+
+
+def test_export_a_week_of_line_items(benchmark, session):
+    end = date.today()
+    rows = benchmark.pedantic(lambda: write_csv(session, "order_items", io.StringIO(), end - timedelta(days=7), end),
+                              rounds=5, iterations=1)
+    assert rows
+
+
+@pytest.mark.parametrize("fmt", FORMATS)
+def test_export_a_quarter_of_archived_line_items(benchmark, session, fmt):
+    # Seeded orders are archived after 90 days, so this is the quarter before that: the bulk of the data
+    end = date.today() - timedelta(days=91)
+    start = end - timedelta(days=90)
+    lines = session.scalar(
+        select(func.count()).select_from(ArchivedOrderItems)
+        .join(ArchivedOrder, ArchivedOrder.order_id == ArchivedOrderItems.order_id)
+        .where(ArchivedOrder.order_time >= datetime.combine(start, datetime.min.time()),
+               ArchivedOrder.order_time < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+    )
+
+    def export():
+        with export_file(session, "archived_order_items", fmt, start, end) as out:
+            return out.seek(0, io.SEEK_END)
+
+    assert benchmark.pedantic(export, rounds=3, iterations=1)
+    benchmark.extra_info["rows"] = lines
+    print(f"\narchived_order_items as {fmt}: {lines:,} rows")
+
+
+def test_menu_catalogue(benchmark, session):
+    def load():
+        bump_menu_version()  # force a reload from the database
+        return cached_menu(session)
+
+    assert benchmark(load)
+
+
+@pytest.fixture(scope="session")
+def busy_day(seeded):
+    """A day with a booking in every 15-minute slot of every table, rebuilt on each run.
+
+    Even-numbered tables are booked solid; the odd ones hold only cancelled and
+    no-show rows, which the overlap queries still have to step over.
+    """
+    customer, tables, _ = seeded
+    day = datetime.combine(date.today() + timedelta(days=500), datetime.min.time())
+    slot = timedelta(minutes=15)
+    rows = [
+        {"user_id": customer, "table_id": table_id, "reservation_time": day + n * slot,
+         "end_time": day + (n + 1) * slot, "party_size": 2,
+         "status": "Confirmed" if i % 2 == 0 else ("Cancelled", "No-Show")[n % 2]}
+        for i, table_id in enumerate(tables) for n in range(96)
+    ]
+    with db.engine.begin() as conn:
+        conn.execute(delete(Reservation).where(Reservation.reservation_time >= day,
+                                               Reservation.reservation_time < day + timedelta(days=1)))
+        conn.execute(insert(Reservation), rows)
+    print(f"\nbusy day {day:%Y-%m-%d}: {len(rows):,} reservations")
+    return day
+
+
+def test_find_and_book_table(benchmark, seeded, busy_day, session):
+    # 90-minute windows round the clock; only the odd tables can take them
+    customer = seeded[0]
+    slots = itertools.count()
+
+    def book():
+        start = busy_day + timedelta(minutes=90 * (next(slots) % 16))
+        table = find_best_table(session, 2, start, start + timedelta(minutes=90))
+        return book_table(session, customer, table.table_id, start, party_size=2)
+
+    assert benchmark.pedantic(book, rounds=200, iterations=1).reservation_id
+
+
+def test_todays_reservations(benchmark, session):
+    benchmark(reservations_on, session, date.today() - timedelta(days=1))
+
+
+def test_busy_day_reservations(benchmark, busy_day, session):
+    assert len(benchmark(reservations_on, session, busy_day.date())) >= 96
+
+
+def test_user_directory_search(benchmark, session):
+    rows, _ = benchmark(user_page, session, 50, search="customer 1")
+    assert rows
+
+
+def test_stock_at_yesterday(benchmark, session):
+    assert benchmark(stock_at, session, datetime.utcnow() - timedelta(days=1)) is not None
+
+
+def test_reorder_lists(benchmark, session):
+    benchmark(reorder_lists, session, 50, 200)
+
+
+def test_archive_completed_orders(benchmark, session):
+    # One week of completed orders per round, oldest first, like the nightly archive job
+    oldest = session.scalar(select(func.min(Order.order_time)).where(Order.status == "Completed"))
+    weeks = itertools.count(1)
+
+    def archive():
+        return archive_completed_orders(session, oldest + timedelta(weeks=next(weeks)))
+
+    assert benchmark.pedantic(archive, rounds=3, iterations=1)
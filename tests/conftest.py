@@ -0,0 +1,68 @@
+import os
+import sys
+import tempfile
+from contextlib import contextmanager
+from decimal import Decimal
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+# The app modules live flat in src/ and db.py connects on import, so point it at a
+# throwaway SQLite file before anything imports it
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+_DB_DIR = tempfile.mkdtemp(prefix="khata-tests-")
+os.environ.setdefault("KHATA_DB_URL", f"sqlite:///{os.path.join(_DB_DIR, 'khata.db')}")
+
+from db import make_engine  # noqa: E402
+from models import Base, User, Table, MenuItem  # noqa: E402
+
+
+@pytest.fixture
+def engine(tmp_path):
+    """A pooled engine on an empty SQLite file with the full schema and foreign keys enforced."""
+    engine = make_engine(f"sqlite:///{tmp_path / 'khata.db'}")
+    # SQLite leaves foreign keys off by default; PostgreSQL always checks them
+    event.listen(engine, "connect", lambda dbapi_conn, record: dbapi_conn.execute("PRAGMA foreign_keys=ON"))
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def restaurant(session):
+    """A customer, two tables and a small menu; returns (user, tables, menu items)."""
+    user = User(name="Ayesha", role="Customer", email="ayesha@example.com")
+    tables = [Table(capacity=2, availability=True), Table(capacity=6, availability=True)]
+    menu = [MenuItem(name=f"Dish {i}", category="Main Course", price=Decimal(100 * i), availability=True)
+            for i in range(1, 6)]
+    session.add_all([user, *tables, *menu])
+    session.commit()
+    return user, tables, menu
+
+
+@contextmanager
+def statements(engine):
+    """Collect (sql, parameters) for every statement `engine` runs inside the block."""
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield seen
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def plan(engine, sql, params):
+    """SQLite's EXPLAIN QUERY PLAN for one statement collected by statements(), as a single line."""
+    with engine.connect() as conn:
+        return " ".join(row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params))
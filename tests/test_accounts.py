@@ -0,0 +1,56 @@
+import time
+import pytest
+import accounts
+from accounts import authenticate, create_user
+
+
+@pytest.fixture(autouse=True)
+def fresh_attempts(monkeypatch):
+    monkeypatch.setattr(accounts, "_failed_attempts", accounts.OrderedDict())
+
+
+@pytest.fixture
+def fast_verify(monkeypatch):
+    # Skips scrypt so thousands of attempts run quickly; the bookkeeping under test is unchanged
+    monkeypatch.setattr(accounts, "verify_password", lambda password, stored: password == "right")
+
+
+def test_login_and_throttle(session):
+    create_user(session, "Bilal", "Customer", email="bilal@example.com", password="s3cret")
+    assert authenticate(session, "Bilal@Example.com ", "s3cret").name == "Bilal"
+    for _ in range(accounts.LOGIN_MAX_ATTEMPTS):
+        assert authenticate(session, "bilal@example.com", "wrong") is None
+    with pytest.raises(ValueError):
+        authenticate(session, "bilal@example.com", "s3cret")
+
+
+def test_bad_logins_dont_grow_the_attempt_map_without_bound(session, fast_verify, monkeypatch):
+    monkeypatch.setattr(accounts, "LOGIN_TRACKED_EMAILS", 100)
+    for n in range(1000):
+        authenticate(session, f"nobody{n}@example.com", "wrong")
+    assert len(accounts._failed_attempts) == 100
+    assert all(len(failures) == 1 for failures in accounts._failed_attempts.values())
+
+    # Expired entries are dropped as soon as anything looks at the map again
+    monkeypatch.setattr(accounts, "LOGIN_WINDOW", 0)
+    time.sleep(0.01)
+    authenticate(session, "someone@example.com", "wrong")
+    assert list(accounts._failed_attempts) == ["someone@example.com"]
+    time.sleep(0.01)
+    with accounts._attempts_lock:
+        assert accounts._recent_failures("someone@example.com", time.monotonic()) == 0
+    assert not accounts._failed_attempts
+
+
+def test_throttle_checks_dont_add_entries():
+    for n in range(50):
+        with accounts._attempts_lock:
+            accounts._recent_failures(f"probe{n}@example.com", time.monotonic())
+    assert not accounts._failed_attempts
+
+
+def test_busy_pool_times_out(session, monkeypatch):
+    monkeypatch.setattr(accounts, "LOGIN_TIMEOUT", 0.05)
+    monkeypatch.setattr(accounts, "verify_password", lambda password, stored: time.sleep(0.5) or True)
+    with pytest.raises(TimeoutError):
+        authenticate(session, "late@example.com", "whatever")
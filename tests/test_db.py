@@ -0,0 +1,141 @@
+import importlib
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sqlalchemy import exc, func, select, text
+from sqlalchemy.orm import scoped_session, sessionmaker
+import db
+from accounts import create_user, customers
+from models import Base, User
+
+THREADS = 16
+
+
+def _run(sessions, work, threads=THREADS):
+    """Call work(i) on `threads` threads at once, removing each thread's scoped session afterwards."""
+    start = threading.Barrier(threads)
+
+    def run(i):
+        start.wait()
+        try:
+            return work(i)
+        finally:
+            sessions.remove()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(run, range(threads)))
+
+
+def test_each_thread_gets_its_own_session():
+    tag = uuid.uuid4().hex[:8]
+
+    def work(i):
+        session = db.Session()
+        assert db.Session() is session  # same scope, same session
+        create_user(session, f"User {i}", "Customer", email=f"{tag}-{i}@example.com")
+        return id(session)
+
+    assert len(set(_run(db.Session, work))) == THREADS
+    with db.Session() as session:
+        assert session.scalar(select(func.count()).where(User.email.like(f"{tag}-%"))) == THREADS
+    db.Session.remove()
+    assert db.engine.pool.checkedout() == 0  # every run returned its connection
+
+
+def test_failed_commit_only_rolls_back_its_own_session():
+    tag = uuid.uuid4().hex[:8]
+    with db.Session() as session:
+        create_user(session, "Taken", "Customer", email=f"{tag}-taken@example.com")
+    db.Session.remove()
+
+    def work(i):
+        session = db.Session()
+        if i % 2:
+            with pytest.raises(ValueError):
+                create_user(session, "Duplicate", "Customer", email=f"{tag}-taken@example.com")
+        else:
+            create_user(session, f"User {i}", "Customer", email=f"{tag}-{i}@example.com")
+        # Rolled back or not, the session is still usable afterwards
+        return session.scalar(select(func.count()).where(User.email.like(f"{tag}-%")))
+
+    assert all(n >= 1 for n in _run(db.Session, work))
+    with db.Session() as session:
+        emails = session.scalars(select(User.email).where(User.email.like(f"{tag}-%"))).all()
+    db.Session.remove()
+    expected = [f"{tag}-taken@example.com"] + [f"{tag}-{i}@example.com" for i in range(0, THREADS, 2)]
+    assert sorted(emails) == sorted(expected)
+
+
+def test_exhausted_pool_queues_then_times_out(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "POOL_SIZE", 2)
+    monkeypatch.setattr(db, "MAX_OVERFLOW", 1)
+    monkeypatch.setattr(db, "POOL_TIMEOUT", 1)
+    engine = db.make_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    sessions = scoped_session(sessionmaker(bind=engine), scopefunc=db._script_run_scope)
+    try:
+        # More runs than connections: the extra ones wait their turn instead of failing
+        results = _run(sessions, lambda i: sessions().execute(text("SELECT :i"), {"i": i}).scalar())
+        assert results == list(range(THREADS))
+        assert engine.pool.checkedout() == 0
+
+        held = [engine.connect() for _ in range(3)]  # pool_size + max_overflow
+        with pytest.raises(exc.TimeoutError):
+            engine.connect()
+        for conn in held:
+            conn.close()
+        with engine.connect() as conn:
+            assert conn.scalar(text("SELECT 1")) == 1
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture
+def replicated(tmp_path, monkeypatch):
+    """db.py reloaded with two SQLite files standing in for the primary and the replica."""
+    monkeypatch.setenv("KHATA_DB_URL", f"sqlite:///{tmp_path / 'primary.db'}")
+    monkeypatch.setenv("KHATA_DB_REPLICA_URL", f"sqlite:///{tmp_path / 'replica.db'}")
+    module = importlib.reload(db)
+    Base.metadata.create_all(module.read_engine)  # what replication would have copied over
+    try:
+        yield module
+    finally:
+        module.Session.remove()
+        module.ReadSession.remove()
+        module.engine.dispose()
+        module.read_engine.dispose()
+        monkeypatch.undo()
+        importlib.reload(db)
+
+
+def _emails(engine):
+    with engine.connect() as conn:
+        return conn.scalars(select(User.email).order_by(User.email)).all()
+
+
+def test_writes_go_to_the_primary_and_reads_to_the_replica(replicated):
+    assert replicated.read_engine is not replicated.engine
+    create_user(replicated.session, "Sana", "Customer", email="sana@example.com")
+    assert _emails(replicated.engine) == ["sana@example.com"]
+    assert _emails(replicated.read_engine) == []
+
+    # Once the row has been replicated, reporting reads see it through read_session
+    with replicated.read_engine.begin() as conn:
+        conn.execute(User.__table__.insert(), {"name": "Sana", "role": "Customer", "email": "sana@example.com"})
+        conn.execute(User.__table__.insert(), {"name": "Only On Replica", "role": "Customer"})
+    assert [u.name for u in customers(replicated.read_session)] == ["Only On Replica", "Sana"]
+    assert [u.name for u in customers(replicated.session)] == ["Sana"]
+
+
+def test_read_session_refuses_to_flush(replicated):
+    replicated.read_session.add(User(name="Sneaky", role="Customer", email="sneaky@example.com"))
+    with pytest.raises(RuntimeError, match="read-only"):
+        replicated.read_session.flush()
+    replicated.read_session.rollback()
+    assert _emails(replicated.engine) == _emails(replicated.read_engine) == []
+
+
+@pytest.mark.skipif(bool(os.environ.get("KHATA_DB_REPLICA_URL")), reason="a replica is configured")
+def test_without_a_replica_reads_share_the_primary_session():
+    assert db.ReadSession is db.Session and db.read_engine is db.engine
@@ -0,0 +1,63 @@
+import io
+import pytest
+import exports
+from orders import archive_orders, create_order
+from exports import export_batches, write_csv, write_parquet
+
+
+@pytest.fixture
+def history(session, restaurant):
+    """23 orders of 1-5 lines; the first 15 archived. Returns {export name: row count}."""
+    user, tables, menu = restaurant
+    orders = [create_order(session, user.user_id, tables[n % 2].table_id,
+                           {item.item_id: 1 for item in menu[: 1 + n % 5]})[0] for n in range(23)]
+    archive_orders(session, [o.order_id for o in orders[:15]])
+    lines = [1 + n % 5 for n in range(23)]
+    return {"orders": 8, "order_items": sum(lines[15:]),
+            "archived_orders": 15, "archived_order_items": sum(lines[:15])}
+
+
+@pytest.fixture
+def batch_sizes(monkeypatch):
+    """Lengths of the batches each writer pulls through export_batches()."""
+    sizes = []
+
+    def recording(*args, **kwargs):
+        columns, batches = export_batches(*args, **kwargs)
+
+        def counted():
+            for batch in batches:
+                sizes.append(len(batch))
+                yield batch
+        return columns, counted()
+
+    monkeypatch.setattr(exports, "export_batches", recording)
+    return sizes
+
+
+@pytest.mark.parametrize("name", list(exports.EXPORTS))
+def test_export_batches_are_bounded(session, history, name):
+    columns, batches = export_batches(session, name, batch_size=4)
+    sizes = [len(batch) for batch in batches]
+    assert sum(sizes) == history[name]
+    assert max(sizes) <= 4 and sizes[:-1] == [4] * (len(sizes) - 1)
+    assert "order_time" in columns
+
+
+@pytest.mark.parametrize("name", ["order_items", "archived_order_items"])
+def test_csv_export_streams_bounded_batches(session, history, batch_sizes, name):
+    out = io.StringIO()
+    assert write_csv(session, name, out, batch_size=4) == history[name]
+    assert max(batch_sizes) <= 4 and sum(batch_sizes) == history[name]
+    assert len(out.getvalue().splitlines()) == history[name] + 1  # header
+
+
+@pytest.mark.parametrize("name", ["order_items", "archived_order_items"])
+def test_parquet_export_writes_one_bounded_row_group_per_batch(session, history, batch_sizes, name):
+    pq = pytest.importorskip("pyarrow.parquet")
+    out = io.BytesIO()
+    assert write_parquet(session, name, out, batch_size=4) == history[name]
+    out.seek(0)
+    meta = pq.ParquetFile(out).metadata
+    groups = [meta.row_group(i).num_rows for i in range(meta.num_row_groups)]
+    assert groups == batch_sizes and max(groups) <= 4 and meta.num_rows == history[name]
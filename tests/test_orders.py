@@ -0,0 +1,162 @@
+from datetime import timedelta
+import pytest
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import sessionmaker
+from conftest import statements
+from models import ArchivedFeedback, ArchivedOrder, ArchivedOrderItems, ArchivedPayment, Feedback, Order, Payment
+from orders import KitchenBoard, archive_orders, create_order, delete_archived_order, order_page, \
+    transition_order_status
+from reports import feedback_page
+
+
+def _place(session, user, tables, menu, count):
+    for n in range(count):
+        create_order(session, user.user_id, tables[n % 2].table_id,
+                     {item.item_id: 1 + (n + i) % 3 for i, item in enumerate(menu[: 1 + n % 4])})
+
+
+def _render_board(engine, page_size):
+    """What track_orders() shows for one page, in a fresh session; returns the statements run."""
+    session = sessionmaker(bind=engine)()
+    try:
+        with statements(engine) as seen:
+            orders, _ = order_page(session, page_size)
+            for order in orders:
+                order.user.name
+                for line in order.order_items:
+                    (line.menu_item.name, line.quantity, line.total_price)
+        return orders, seen
+    finally:
+        session.close()
+
+
+def test_order_board_runs_constant_statements(engine, session, restaurant):
+    _place(session, *restaurant, 3)
+    few, few_sql = _render_board(engine, page_size=50)
+
+    _place(session, *restaurant, 60)
+    many, many_sql = _render_board(engine, page_size=50)
+
+    assert len(few) == 3 and len(many) == 50
+    assert sum(len(o.order_items) for o in many) > 100
+    # Orders + users in one query, line items + menu items in one SELECT ... IN
+    assert len(few_sql) == len(many_sql) == 2
+
+
+def _count(session, model):
+    return session.scalar(select(func.count()).select_from(model))
+
+
+def test_archiving_moves_feedback_and_payments_with_the_order(session, restaurant):
+    user, tables, menu = restaurant
+    _place(session, user, tables, menu, 3)
+    rated, paid, plain = session.scalars(select(Order.order_id).order_by(Order.order_id)).all()
+    session.add_all([Feedback(user_id=user.user_id, order_id=rated, rating=4, comments="Lovely"),
+                     Payment(order_id=paid, payment_type="Cash", amount=100, status="Completed")])
+    session.commit()
+
+    # Foreign keys are enforced (see conftest), so this fails if the order goes before its feedback
+    assert archive_orders(session, [rated, paid]) == 2
+    assert session.scalars(select(Order.order_id)).all() == [plain]
+    assert _count(session, Feedback) == _count(session, Payment) == 0
+    archived = session.get(ArchivedFeedback, session.scalar(select(ArchivedFeedback.feedback_id)))
+    assert (archived.order_id, archived.rating, archived.order.order_id) == (rated, 4, rated)
+    assert session.scalar(select(ArchivedPayment.order_id)) == paid
+    rows, _ = feedback_page(session, 10)
+    assert [(f.order_id, f.comments) for f in rows] == [(rated, "Lovely")]
+
+    delete_archived_order(session, session.get(ArchivedOrder, rated))
+    assert _count(session, ArchivedFeedback) == 0
+    assert session.scalars(select(ArchivedOrderItems.order_id).distinct()).all() == [paid]
+
+
+def _board(board, status):
+    return [t["order_id"] for t in board.by_status(status)]
+
+
+def test_kitchen_board_applies_changes_on_the_next_refresh(engine, session, restaurant):
+    user, tables, menu = restaurant
+    _place(session, user, tables, menu, 3)
+    first, second, third = session.scalars(select(Order.order_id).order_by(Order.order_id)).all()
+    board = KitchenBoard()
+    assert board.refresh(session) == 3
+    assert _board(board, "Pending") == [first, second, third]
+
+    transition_order_status(session, first, "In Progress")
+    transition_order_status(session, second, "In Progress")
+    transition_order_status(session, second, "Completed")
+    _place(session, user, tables, menu, 1)
+    fourth = session.scalar(select(func.max(Order.order_id)))
+    with statements(engine) as seen:
+        board.refresh(session)
+    assert "updated_at >=" in seen[0][0]  # a delta poll, not a reload
+    assert _board(board, "In Progress") == [first]
+    assert _board(board, "Pending") == [third, fourth]
+    assert second not in board.tickets  # Completed orders drop off
+
+
+def test_kitchen_board_high_water_never_moves_backwards(session, restaurant):
+    user, tables, menu = restaurant
+    _place(session, user, tables, menu, 2)
+    board = KitchenBoard(grace=timedelta(seconds=5))
+    board.refresh(session)
+    mark = board.high_water
+
+    # Every row the next poll sees is stamped before the mark, e.g. by a clock running behind
+    session.execute(update(Order).values(updated_at=mark - timedelta(seconds=2)))
+    session.commit()
+    assert board.refresh(session) == 2
+    assert board.high_water == mark
+
+    _place(session, user, tables, menu, 1)
+    board.refresh(session)
+    assert board.high_water > mark
+
+
+def test_kitchen_board_grace_window_refetches_late_commits(session, restaurant):
+    user, tables, menu = restaurant
+    _place(session, user, tables, menu, 2)
+    board = KitchenBoard(grace=timedelta(seconds=5))
+    board.refresh(session)
+    mark = board.high_water
+
+    # Committed after the last poll but stamped before its mark, like a transaction that started earlier
+    late, lost = session.scalars(select(Order.order_id).order_by(Order.order_id)).all()
+    session.execute(update(Order).where(Order.order_id == late)
+                    .values(status="In Progress", updated_at=mark - timedelta(seconds=2)))
+    session.execute(update(Order).where(Order.order_id == lost)
+                    .values(status="In Progress", updated_at=mark - timedelta(seconds=30)))
+    session.commit()
+    board.refresh(session)
+    assert _board(board, "In Progress") == [late]
+    assert _board(board, "Pending") == [lost]  # outside the grace window: left for the next full reload
+
+    board.last_resync -= board.resync_every
+    board.refresh(session)
+    assert _board(board, "In Progress") == [late, lost]
+
+
+def test_status_transitions_refuse_stale_and_disallowed_moves(session, restaurant):
+    user, tables, menu = restaurant
+    _place(session, user, tables, menu, 1)
+    order = session.scalar(select(Order))
+    seen = order.version
+
+    transition_order_status(session, order.order_id, "In Progress", expected_version=seen)
+    with pytest.raises(ValueError, match="changed by someone else and is now In Progress"):
+        transition_order_status(session, order.order_id, "Completed", expected_version=seen)
+    session.expire_all()
+    assert (order.status, order.version) == ("In Progress", seen + 1)  # not overwritten
+
+    _place(session, user, tables, menu, 1)
+    pending = session.scalar(select(func.max(Order.order_id)))
+    with pytest.raises(ValueError, match="is Pending and can't move to Completed"):
+        transition_order_status(session, pending, "Completed")
+    with pytest.raises(ValueError, match="can't be moved to Archived"):
+        transition_order_status(session, pending, "Archived")
+    with pytest.raises(ValueError, match="#999 no longer exists"):
+        transition_order_status(session, 999, "In Progress")
+    assert session.get(Order, pending).status == "Pending"
+
+    transition_order_status(session, order.order_id, "Completed", expected_version=seen + 1)
+    assert session.get(Order, order.order_id).status == "Completed"
@@ -0,0 +1,67 @@
+import threading
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.orm import sessionmaker
+import perf
+from models import OrderItems
+from orders import create_order, order_page
+from perf import statement_shape
+
+
+@pytest.fixture
+def instrumented(engine, monkeypatch):
+    """`engine` timed by perf.py with runs scoped to the current thread; global stats restored afterwards."""
+    monkeypatch.setattr(perf, "_scopefunc", perf._scopefunc)
+    monkeypatch.setattr(perf, "_active", {})
+    monkeypatch.setattr(perf, "_pages", {})
+    monkeypatch.setattr(perf, "_recent", perf.deque(maxlen=perf.RECENT_RUNS))
+    perf.instrument(engine, threading.get_ident)
+    return engine
+
+
+def test_statement_shape_ignores_literals_and_in_list_lengths():
+    assert statement_shape("SELECT * FROM t WHERE id IN (?, ?, ?)") == \
+        statement_shape("SELECT *  FROM t\n WHERE id IN (?)") == "SELECT * FROM t WHERE id IN (?)"
+    assert statement_shape("SELECT * FROM t WHERE name = 'O''Brien' AND n > 42.5") == \
+        "SELECT * FROM t WHERE name = ? AND n > ?"
+    assert statement_shape("SELECT * FROM t WHERE b IN (%s, %s) AND c IN ($1, $2, $3)") == \
+        statement_shape("SELECT * FROM t WHERE b IN (%(b_1)s) AND c IN ($1)") == \
+        "SELECT * FROM t WHERE b IN (?) AND c IN (?)"
+    assert statement_shape("SELECT * FROM t1") != statement_shape("SELECT * FROM t2")  # names keep their digits
+
+
+def test_lazy_loads_are_flagged_as_n_plus_one(instrumented, session, restaurant):
+    user, tables, menu = restaurant
+    for _ in range(3):
+        create_order(session, user.user_id, tables[0].table_id, {item.item_id: 1 for item in menu})
+    fresh = sessionmaker(bind=instrumented)
+
+    perf.begin_run("Lazy")
+    lazy = fresh()
+    names = [line.menu_item.name for line in lazy.query(OrderItems)]  # one SELECT per distinct menu item
+    run = perf.end_run()
+    lazy.close()
+    assert len(names) == 15
+    ((shape, count),) = run.n_plus_one()
+    assert count == len(menu) >= perf.N_PLUS_ONE_MIN
+    assert shape.startswith("SELECT menu_items.") and shape.endswith("WHERE menu_items.item_id = ?")
+
+    perf.begin_run("Eager")
+    eager = fresh()
+    orders, _ = order_page(eager, 50)
+    assert sum(len(o.order_items) for o in orders) == 15
+    run = perf.end_run()
+    eager.close()
+    assert run.statements == 2 and run.n_plus_one() == []
+    assert {p.page: sum(p.n_plus_one.values()) for p in perf.page_stats()} == {"Lazy": 1, "Eager": 0}
+
+
+def test_failed_statements_dont_leak_timers(instrumented):
+    with instrumented.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(exc.OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            conn.rollback()
+        assert conn.info["perf_started"] == []
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert conn.info["perf_started"] == []
@@ -0,0 +1,103 @@
+import threading
+from decimal import Decimal
+import pytest
+from sqlalchemy import exc, func, select
+from sqlalchemy.orm import sessionmaker
+from conftest import statements
+from models import ArchivedOrder, DailyRating, ItemRating, PendingSale
+from orders import archive_orders, create_order, delete_archived_order
+from reports import fold_pending_sales, rebuild_rating_rollups, rebuild_sales_rollups, sales_totals, \
+    submit_feedback, top_items
+
+
+def test_orders_only_queue_deltas_until_folded(engine, session, restaurant):
+    user, tables, menu = restaurant
+    with statements(engine) as seen:
+        create_order(session, user.user_id, tables[0].table_id, {menu[1].item_id: 2, menu[0].item_id: 1})
+    # No rollup row is locked by the order transaction
+    assert not [sql for sql, _ in seen if "sales_rollups" in sql]
+    assert sales_totals(session) == (0, 0, 0)
+
+    create_order(session, user.user_id, tables[1].table_id, {menu[0].item_id: 3})
+    assert fold_pending_sales(session) == 5  # two order rows and three line rows
+    assert sales_totals(session) == (2, 6, Decimal("800.00"))
+    assert [(name, qty) for name, qty, _ in top_items(session)] == [("Dish 1", 4), ("Dish 2", 2)]
+    assert session.scalar(select(func.count()).select_from(PendingSale)) == 0
+    assert fold_pending_sales(session) == 0
+
+
+def test_fold_upserts_rollup_rows_in_key_order(engine, session, restaurant):
+    user, tables, menu = restaurant
+    create_order(session, user.user_id, tables[0].table_id, {item.item_id: 1 for item in reversed(menu)})
+    with statements(engine) as seen:
+        fold_pending_sales(session)
+    item_rows = next(params for sql, params in seen if "item_sales_rollups" in sql)
+    keys = [(row[0], row[1], row[2]) for row in item_rows]
+    assert keys == sorted(keys)
+
+
+def test_deleting_an_archived_order_takes_it_out_of_the_rollups(session, restaurant):
+    user, tables, menu = restaurant
+    kept, _ = create_order(session, user.user_id, tables[0].table_id, {menu[0].item_id: 1})
+    gone, _ = create_order(session, user.user_id, tables[0].table_id, {menu[2].item_id: 2})
+    archive_orders(session, [kept.order_id, gone.order_id])
+    fold_pending_sales(session)
+    assert sales_totals(session) == (2, 3, Decimal("700.00"))
+
+    delete_archived_order(session, session.get(ArchivedOrder, gone.order_id))
+    fold_pending_sales(session)
+    assert sales_totals(session) == (1, 1, Decimal("100.00"))
+
+    rebuild_sales_rollups(session)
+    session.commit()
+    assert sales_totals(session) == (1, 1, Decimal("100.00"))
+
+
+def test_concurrent_folds_count_each_order_once(engine, session, restaurant):
+    user, tables, menu = restaurant
+    for n in range(40):
+        create_order(session, user.user_id, tables[n % 2].table_id, {menu[n % 5].item_id: 1})
+
+    factory = sessionmaker(bind=engine)
+    start = threading.Barrier(4)
+
+    def fold():
+        with factory() as own:
+            start.wait()
+            fold_pending_sales(own, batch_size=7)
+
+    threads = [threading.Thread(target=fold) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    session.expire_all()
+    assert sales_totals(session)[:2] == (40, 40)
+
+
+def _ratings(session):
+    session.expire_all()
+    return (sorted((r.day, r.rating_count, r.rating_sum) for r in session.query(DailyRating) if r.rating_count),
+            sorted((r.item_id, r.rating_count, r.rating_sum) for r in session.query(ItemRating) if r.rating_count))
+
+
+def test_incremental_and_rebuilt_rating_rollups_agree(session, restaurant):
+    user, tables, menu = restaurant
+    orders = [create_order(session, user.user_id, tables[0].table_id,
+                           {menu[n].item_id: 1, menu[n + 1].item_id: 2})[0] for n in range(4)]
+    for order, rating in zip(orders, (5, 2, 4)):
+        submit_feedback(session, user.user_id, order.order_id, rating)
+    submit_feedback(session, user.user_id, orders[0].order_id, 3, comments="Second visit")
+    with pytest.raises(exc.IntegrityError):
+        submit_feedback(session, user.user_id, 999, 1)  # no such order: nothing is half-written
+
+    # Ratings on archived orders stay counted, and leave with an archived order that is deleted
+    archive_orders(session, [orders[0].order_id, orders[1].order_id])
+    delete_archived_order(session, session.get(ArchivedOrder, orders[1].order_id))
+    incremental = _ratings(session)
+    assert incremental[1] == [(menu[0].item_id, 2, 8), (menu[1].item_id, 2, 8),
+                              (menu[2].item_id, 1, 4), (menu[3].item_id, 1, 4)]
+
+    rebuild_rating_rollups(session)
+    session.commit()
+    assert _ratings(session) == incremental
@@ -0,0 +1,63 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from conftest import plan, statements
+from models import Reservation
+from reservations import MAX_DURATION, TableSchedule, book_table, find_best_table, reservations_on
+
+NOON = datetime(2025, 3, 1, 12, 0)
+HOUR = timedelta(hours=1)
+
+
+def _overlaps(intervals, start, end):
+    return any(s < end and e > start for s, e in intervals)
+
+
+def test_schedule_matches_a_linear_scan_even_with_overlapping_rows():
+    rng = random.Random(7)
+    for _ in range(200):
+        # Legacy rows were never checked for overlaps, so these may overlap each other
+        intervals = []
+        for _ in range(rng.randrange(12)):
+            start = NOON + timedelta(minutes=15 * rng.randrange(48))
+            intervals.append((start, start + timedelta(minutes=15 * rng.randrange(1, 16))))
+        loaded = TableSchedule(intervals[: len(intervals) // 2])
+        for start, end in intervals[len(intervals) // 2:]:
+            loaded.add(start, end)
+        for schedule in (TableSchedule(intervals), loaded):
+            for _ in range(20):
+                start = NOON + timedelta(minutes=15 * rng.randrange(-4, 52))
+                end = start + timedelta(minutes=15 * rng.randrange(1, 12))
+                assert schedule.is_free(start, end) == (not _overlaps(intervals, start, end))
+
+
+def test_booking_rejects_overlaps_only(session, restaurant):
+    user, tables, _ = restaurant
+    table_id = tables[1].table_id
+    book_table(session, user.user_id, table_id, NOON, duration=5 * HOUR, party_size=4)
+
+    with pytest.raises(ValueError, match="already booked"):
+        book_table(session, user.user_id, table_id, NOON + 4 * HOUR + timedelta(minutes=30), party_size=4)
+    assert find_best_table(session, 4, NOON + 4 * HOUR, NOON + 6 * HOUR) is None
+    # Back to back is fine
+    book_table(session, user.user_id, table_id, NOON + 5 * HOUR, party_size=4)
+    assert find_best_table(session, 2, NOON + HOUR, NOON + 2 * HOUR).table_id == tables[0].table_id
+
+    with pytest.raises(ValueError, match="at most"):
+        book_table(session, user.user_id, tables[0].table_id, NOON, duration=MAX_DURATION + HOUR)
+    assert session.query(Reservation).count() == 2
+
+
+def test_reservation_queries_use_the_time_indexes(engine, session, restaurant):
+    user, tables, _ = restaurant
+    with statements(engine) as seen:
+        reservations_on(session, NOON.date())
+    sql, params = seen[-1]
+    assert "SEARCH reservations USING INDEX ix_reservations_time (reservation_time>? AND reservation_time<?)" \
+        in plan(engine, sql, params)
+
+    with statements(engine) as seen:
+        book_table(session, user.user_id, tables[0].table_id, NOON)
+    sql, params = next((sql, params) for sql, params in seen if sql.lstrip().startswith("SELECT reservations."))
+    assert "SEARCH reservations USING INDEX ix_reservations_table_time " \
+           "(table_id=? AND reservation_time>? AND reservation_time<?)" in plan(engine, sql, params)
@@ -0,0 +1,157 @@
+import time
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import func, select
+import catalogue
+import stock
+from conftest import plan, statements
+from models import Inventory, Order, OrderItems, PendingSale, RecipeItem, StockMovement, StockSnapshot
+from orders import create_order
+from stock import add_stock_item, receive_stock, record_waste, reorder_lists, stock_at, take_snapshot
+
+
+def _tick():
+    # Ledger rows are stamped with utcnow(); keep checkpoints strictly between them
+    time.sleep(0.002)
+    moment = datetime.utcnow()
+    time.sleep(0.002)
+    return moment
+
+
+@pytest.fixture
+def kitchen(session, restaurant):
+    """Dish 1 takes 2 flour + 1 ghee a portion, Dish 2 takes 3 rice + 1 ghee; returns (user, table, menu, stock)."""
+    user, tables, menu = restaurant
+    stock = {name: add_stock_item(session, name, quantity).item_id
+             for name, quantity in (("Flour", 10), ("Rice", 7), ("Ghee", 100))}
+    session.add_all([
+        RecipeItem(menu_item_id=menu[0].item_id, inventory_item_id=stock["Flour"], quantity=2),
+        RecipeItem(menu_item_id=menu[0].item_id, inventory_item_id=stock["Ghee"], quantity=1),
+        RecipeItem(menu_item_id=menu[1].item_id, inventory_item_id=stock["Rice"], quantity=3),
+        RecipeItem(menu_item_id=menu[1].item_id, inventory_item_id=stock["Ghee"], quantity=1),
+    ])
+    session.commit()
+    return user, tables[0], menu, stock
+
+
+def _quantities(session):
+    session.expire_all()
+    return dict(session.execute(select(Inventory.name, Inventory.quantity)).all())
+
+
+def _count(session, model):
+    return session.scalar(select(func.count()).select_from(model))
+
+
+def test_a_short_order_rolls_back_completely(session, kitchen):
+    user, table, menu, _ = kitchen
+    movements = _count(session, StockMovement)
+    with pytest.raises(ValueError, match="Not enough stock for: Rice"):
+        create_order(session, user.user_id, table.table_id, {menu[0].item_id: 1, menu[1].item_id: 3})
+
+    assert _count(session, Order) == _count(session, OrderItems) == _count(session, PendingSale) == 0
+    assert _count(session, StockMovement) == movements
+    assert _quantities(session) == {"Flour": 10, "Rice": 7, "Ghee": 100}
+
+
+def test_orders_switch_dishes_off_and_restocking_switches_them_back(session, kitchen):
+    user, table, menu, stock = kitchen
+    version = catalogue._version
+    create_order(session, user.user_id, table.table_id, {menu[1].item_id: 1, menu[2].item_id: 1})
+    assert _quantities(session) == {"Flour": 10, "Rice": 4, "Ghee": 99}
+    assert catalogue._version == version  # Rice still covers a portion
+
+    create_order(session, user.user_id, table.table_id, {menu[1].item_id: 1})
+    session.expire_all()
+    assert (menu[1].availability, menu[1].stock_out) == (False, True)
+    assert menu[0].availability and not menu[0].stock_out  # shares only Ghee, which is plentiful
+    assert catalogue._version == version + 1
+
+    # Switched-off dishes are skipped, and come back once every ingredient covers a portion
+    with pytest.raises(ValueError, match="None of the selected items are available"):
+        create_order(session, user.user_id, table.table_id, {menu[1].item_id: 1})
+    assert receive_stock(session, stock["Rice"], 1) is False  # 2 < 3 a portion
+    assert receive_stock(session, stock["Rice"], 1) is True
+    session.expire_all()
+    assert (menu[1].availability, menu[1].stock_out) == (True, False)
+
+
+def test_waste_switches_off_dishes_it_leaves_short(session, kitchen):
+    user, table, menu, stock = kitchen
+    assert record_waste(session, stock["Flour"], 5) == (5, False)
+    assert record_waste(session, stock["Flour"], 4) == (4, True)
+    session.expire_all()
+    assert (menu[0].availability, menu[0].stock_out) == (False, True)
+    assert menu[1].availability
+    assert record_waste(session, stock["Flour"], 5) == (1, False)  # never below zero
+
+
+def test_reorder_lists_top_up_to_the_target(session):
+    for name, quantity, supplier in (("Flour", 3, 1), ("Salt", 9, 1), ("Rice", 0, 2), ("Ghee", 40, 2)):
+        session.add(Inventory(name=name, quantity=quantity, supplier_id=supplier))
+    session.commit()
+
+    assert reorder_lists(session, 10, 25) == [
+        (1, 2, 38, [("Flour", 3, 22), ("Salt", 9, 16)]),
+        (2, 1, 25, [("Rice", 0, 25)]),
+    ]
+    assert reorder_lists(session, 10, 10)[0][3] == [("Flour", 3, 7), ("Salt", 9, 1)]  # every amount positive
+    with pytest.raises(ValueError, match="can't be below the reorder level"):
+        reorder_lists(session, 10, 5)
+
+
+def test_stock_at_replays_from_the_nearest_snapshot(session):
+    flour = add_stock_item(session, "Flour", 100).item_id
+    salt = add_stock_item(session, "Salt", 50).item_id
+    before_snapshots = _tick()
+    record_waste(session, flour, 10)
+    take_snapshot(session)
+    session.commit()
+    after_first = _tick()
+
+    receive_stock(session, flour, 5)
+    rice = add_stock_item(session, "Rice", 30).item_id  # not in the snapshot above
+    record_waste(session, salt, 999)
+    middle = _tick()
+
+    take_snapshot(session)
+    session.commit()
+    record_waste(session, rice, 4)
+    now = _tick()
+
+    assert stock_at(session, before_snapshots) == {flour: 100, salt: 50}
+    assert stock_at(session, after_first) == {flour: 90, salt: 50}
+    assert stock_at(session, middle) == {flour: 95, salt: 0, rice: 30}
+    assert stock_at(session, now) == {flour: 95, salt: 0, rice: 26}
+
+
+def test_ledger_writes_take_a_snapshot_when_one_is_due(session, monkeypatch):
+    def snapshots():
+        return session.execute(select(StockSnapshot.taken_at, StockSnapshot.quantity)
+                               .order_by(StockSnapshot.taken_at)).all()
+
+    flour = add_stock_item(session, "Flour", 100).item_id  # no snapshot yet, so this write takes one
+    record_waste(session, flour, 1)
+    assert [quantity for _, quantity in snapshots()] == [100]
+
+    monkeypatch.setattr(stock, "SNAPSHOT_EVERY", timedelta(0))
+    receive_stock(session, flour, 5)
+    _, (second, quantity) = snapshots()
+    assert quantity == 104  # taken after the receipt, in the same transaction
+    assert session.scalar(select(func.max(StockMovement.moved_at))) <= second
+    assert stock_at(session, datetime.utcnow()) == {flour: 104}
+
+
+def test_stock_at_scans_only_the_ledger_after_the_snapshot(engine, session):
+    add_stock_item(session, "Flour", 100)
+    take_snapshot(session, datetime.utcnow() - timedelta(hours=1))
+    session.commit()
+    with statements(engine) as seen:
+        stock_at(session, datetime.utcnow())
+
+    plans = [plan(engine, sql, params) for sql, params in seen]
+    assert len(plans) == 3  # latest snapshot time, its rows, the ledger since
+    assert "SEARCH stock_snapshots USING INDEX ix_stock_snapshots_taken_at (taken_at=?)" in plans[1]
+    assert "SEARCH stock_movements USING INDEX ix_stock_movements_moved_at (moved_at>? AND moved_at<?)" \
+        in plans[2]
+    assert not any("SCAN stock_" in plan for plan in plans)